@@ -1,7 +1,9 @@
 #!/bin/bash
 # BRTN Transcriber Runner
+CALLDIR=$(pwd)
 BASEDIR=$(dirname "$0")
 cd "$BASEDIR"
+BASEDIR=$(pwd)
 
 case "$1" in
     "settings")
@@ -11,12 +13,27 @@ case "$1" in
     "stop")
         echo "Stopping BRTN Transcriber..."
         pkill -f brtn_transcriber.py
+        pkill -f brtn_worker.py
+        ;;
+    "transcribe")
+        # Input paths are relative to where we were called from
+        cd "$CALLDIR" && "$BASEDIR/.venv/bin/python" "$BASEDIR/brtn_batch.py" "${@:2}"
+        ;;
+    "history")
+        "$BASEDIR/.venv/bin/python" "$BASEDIR/brtn_history.py" "${@:2}"
+        ;;
+    "archive")
+        "$BASEDIR/.venv/bin/python" "$BASEDIR/brtn_archive.py" "${@:2}"
+        ;;
+    "worker")
+        echo "Starting BRTN model worker in background..."
+        nohup ./.venv/bin/python brtn_worker.py "${@:2}" > /dev/null 2>&1 &
         ;;
     "run")
         echo "Starting BRTN Transcriber in background..."
         nohup ./.venv/bin/python brtn_transcriber.py > /dev/null 2>&1 &
         ;;
     *)
-        echo "Usage: $0 {run|settings|stop}"
+        echo "Usage: $0 {run|settings|stop|worker|transcribe|history|archive}"
         ;;
 esac
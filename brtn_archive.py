@@ -0,0 +1,182 @@
+import os
+import sys
+import json
+import time
+import queue
+import shutil
+import argparse
+import threading
+import subprocess
+from brtn_metrics import METRICS, log
+
+# RECORDING ARCHIVE
+# With "archive" set to flac or opus, every take's audio is kept for later
+# re-transcription. Capture hands raw int16 blocks to a bounded queue and never
+# waits: a writer thread streams them into an ffmpeg encoder, and if it falls
+# behind blocks are dropped (archive_dropped_total) instead of stalling _run_rec.
+# Takes are laid back to back in segment files of about segment_seconds, and
+# index.jsonl says where each take ID lives. A segment is finalized once it is
+# long enough or dictation pauses, and the oldest go first past max_mb.
+#
+#   ./brtn.sh archive list --since 1d
+#   ./brtn.sh transcribe archive:20240501-093012-0003
+ARCHIVE_DIR = "~/.brtn_archive"
+RATE = 16000 # brtn_audio.RATE, without importing numpy on the capture side
+CODECS = {"flac": (".flac", ["-c:a", "flac", "-compression_level", "5"]),
+          "opus": (".opus", ["-c:a", "libopus", "-b:a", "24k", "-application", "voip"])}
+QUEUE_BLOCKS = 1024 # ~64 s of 1024-frame blocks
+IDLE_CLOSE = 30 # seconds without a take before the open segment is finalized
+
+class Archive:
+    def __init__(self, path=ARCHIVE_DIR, codec="flac", segment_seconds=600, max_mb=2048):
+        if codec not in CODECS: raise ValueError(f"unknown archive codec {codec!r}")
+        if not shutil.which("ffmpeg"): raise RuntimeError("ffmpeg not found")
+        self.path = os.path.expanduser(path)
+        os.makedirs(self.path, exist_ok=True)
+        self.codec = codec
+        self.segment_seconds = segment_seconds
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.q = queue.SimpleQueue()
+        self.room = threading.BoundedSemaphore(QUEUE_BLOCKS) # data blocks only; begin/end are never dropped
+        self.seq = 0
+        self.segments = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    # Capture side: none of these block
+    def begin(self):
+        self.seq += 1
+        take_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{self.seq:04d}"
+        self.q.put(("begin", take_id, time.time()))
+        return take_id
+
+    def write(self, take_id, data):
+        if not self.room.acquire(blocking=False):
+            METRICS.inc("archive_dropped_total")
+            return
+        self.q.put(("data", take_id, data))
+
+    def end(self, take_id):
+        self.q.put(("end", take_id, None))
+
+    # Writer thread
+    def _run(self):
+        enc, segment, samples, take = None, None, 0, None
+        while True:
+            try: kind, take_id, payload = self.q.get(timeout=IDLE_CLOSE if enc and not take else None)
+            except queue.Empty: # dictation paused: finalize so the segment is complete on disk
+                self._close(enc)
+                enc = None
+                continue
+            if kind == "data": self.room.release()
+            try:
+                if kind == "begin":
+                    if enc and samples >= self.segment_seconds * RATE: # roll over between takes only
+                        self._close(enc)
+                        enc = None
+                    if enc is None:
+                        self.segments += 1
+                        segment = f"{time.strftime('%Y%m%d-%H%M%S')}-{self.segments:03d}{CODECS[self.codec][0]}"
+                        enc, samples = self._open(segment), 0
+                    take = {"id": take_id, "segment": segment, "start": samples / RATE, "time": payload}
+                elif kind == "data" and take and take["id"] == take_id:
+                    enc.stdin.write(payload)
+                    samples += len(payload) // 2
+                elif kind == "end" and take and take["id"] == take_id:
+                    take["seconds"] = round(samples / RATE - take["start"], 3)
+                    enc.stdin.flush()
+                    with open(os.path.join(self.path, "index.jsonl"), "a") as f: f.write(json.dumps(take) + "\n")
+                    METRICS.inc("archived_seconds_total", take["seconds"])
+                    take = None
+                    self._prune()
+            except (OSError, ValueError) as e:
+                log(f"ARCHIVE: {e}")
+                if enc: self._close(enc, kill=True)
+                enc, take = None, None
+
+    def _open(self, segment):
+        cmd = ["ffmpeg", "-loglevel", "error", "-f", "s16le", "-ar", str(RATE), "-ac", "1", "-i", "-",
+               *CODECS[self.codec][1], "-y", os.path.join(self.path, segment)]
+        return subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL)
+
+    def _close(self, enc, kill=False):
+        # Must not raise: a dead encoder fails the flush in close(), and the writer thread has to go on
+        try: enc.stdin.close()
+        except OSError: pass
+        if kill: enc.kill()
+        enc.wait()
+
+    def _prune(self):
+        segments = sorted(f for f in os.listdir(self.path) if f.endswith(CODECS[self.codec][0]))
+        sizes = {f: os.path.getsize(os.path.join(self.path, f)) for f in segments}
+        total, gone = sum(sizes.values()), set()
+        for f in segments[:-1]: # never the one being written
+            if total <= self.max_bytes: break
+            os.remove(os.path.join(self.path, f))
+            total -= sizes[f]
+            gone.add(f)
+        if gone:
+            entries = [e for e in read_index(self.path) if e["segment"] not in gone]
+            tmp = os.path.join(self.path, "index.jsonl.tmp")
+            with open(tmp, "w") as f: f.writelines(json.dumps(e) + "\n" for e in entries)
+            os.replace(tmp, os.path.join(self.path, "index.jsonl"))
+            log(f"ARCHIVE: Pruned {len(gone)} segment(s).")
+
+def read_index(path=ARCHIVE_DIR):
+    try:
+        with open(os.path.join(os.path.expanduser(path), "index.jsonl")) as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+def load_take(take_id, path=ARCHIVE_DIR):
+    # -> float32 16 kHz mono, ready for WhisperModel.transcribe
+    import numpy as np
+    entry = next((e for e in read_index(path) if e["id"] == take_id), None)
+    if entry is None: raise KeyError(f"no archived take {take_id!r}")
+    cmd = ["ffmpeg", "-loglevel", "error", "-ss", str(entry["start"]), "-t", str(entry["seconds"]),
+           "-i", os.path.join(os.path.expanduser(path), entry["segment"]), "-f", "s16le", "-ar", str(RATE), "-ac", "1", "-"]
+    out = subprocess.run(cmd, capture_output=True, check=True).stdout
+    return np.frombuffer(out, dtype=np.int16).astype(np.float32) / 32768.0
+
+def open_archive(config):
+    # None when off ("archive": "") or ffmpeg is missing
+    codec = config.get("archive", "")
+    if not codec: return None
+    try:
+        return Archive(config.get("archive_path") or ARCHIVE_DIR, codec, config.get("archive_segment_seconds", 600),
+                       config.get("archive_max_mb", 2048))
+    except (OSError, RuntimeError, ValueError) as e:
+        log(f"ARCHIVE: Disabled ({e})")
+        return None
+
+def main(argv=None):
+    from brtn_config import load_config
+    from brtn_history import parse_time
+    ap = argparse.ArgumentParser(prog="brtn archive", description="List or export archived takes")
+    ap.add_argument("--path", default=None, help="archive directory (default: archive_path from the config)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("list", help="archived take IDs, oldest first")
+    p.add_argument("--since", type=parse_time, default=None)
+    p = sub.add_parser("export", help="write one take as WAV")
+    p.add_argument("id")
+    p.add_argument("out")
+    args = ap.parse_args(argv)
+    path = args.path or load_config().get("archive_path") or ARCHIVE_DIR
+
+    if args.cmd == "list":
+        for e in read_index(path):
+            if args.since and e["time"] < args.since: continue
+            print(f"{e['id']}  {time.strftime('%Y-%m-%d %H:%M', time.localtime(e['time']))}  {e['seconds']:6.1f}s  {e['segment']}")
+        return 0
+    import wave
+    import numpy as np
+    audio = load_take(args.id, path)
+    with wave.open(args.out, "wb") as w:
+        w.setnchannels(1); w.setsampwidth(2); w.setframerate(RATE)
+        w.writeframes((audio * 32767).astype(np.int16).tobytes())
+    print(f"{args.id}: {audio.size / RATE:.1f}s -> {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+import os
+import time
+import wave
+import queue
+import tempfile
+import threading
+from collections import deque
+import numpy as np
+
+RATE = 16000
+CHUNK = 1024
+SCALE = np.float32(1 / 32768)
+SPILL_SECONDS = 300 # undecoded audio past this lives in a temp file mapping, not RAM
+
+# Take buffer: preallocated float32, int16 chunks are scaled straight into it
+# so the decoder gets the array as-is (no join, no WAV, no re-decode).
+# Indexes are absolute sample positions in the take. Audio before release()
+# is dropped when the buffer fills, which keeps long streaming takes in a
+# fixed RAM window while decoding keeps pace. If it falls behind (or nothing is
+# released, without streaming), a buffer past spill_seconds is backed by an
+# unlinked temp file, so the OS pages it out instead of growing the heap.
+# Compaction moves the live tail into a fresh array, so views already handed to
+# a decoder stay valid.
+class PCMBuffer:
+    def __init__(self, seconds=30, rate=RATE, spill_seconds=SPILL_SECONDS):
+        self.spill = int(spill_seconds * rate)
+        self.buf = self._alloc(int(seconds * rate))
+        self.capacity = self.buf.size
+        self.n = 0 # samples held in buf
+        self.offset = 0 # absolute index of buf[0]
+        self.released = 0
+
+    def _alloc(self, size):
+        if not self.spill or size <= self.spill: return np.zeros(size, dtype=np.float32)
+        f = tempfile.TemporaryFile(prefix="brtn-take-") # gone from disk once the last view is dropped
+        f.truncate(size * 4)
+        return np.memmap(f, dtype=np.float32, mode="w+", shape=(size,))
+
+    def __len__(self):
+        return self.offset + self.n
+
+    def clear(self):
+        self.n = self.offset = self.released = 0
+
+    def release(self, upto):
+        self.released = max(self.released, min(upto, len(self)))
+
+    def append(self, data):
+        v = np.frombuffer(data, dtype=np.int16)
+        end = self.n + v.size
+        if end > self.buf.size:
+            drop = self.released - self.offset
+            keep = self.n - drop
+            # Reclaim released audio; grow by doubling only if the live part doesn't fit
+            size = self.capacity if keep + v.size <= self.capacity else max(keep + v.size, self.buf.size * 2)
+            fresh = self._alloc(size)
+            fresh[:keep] = self.buf[drop:self.n]
+            self.buf, self.offset, self.n = fresh, self.released, keep
+            end = keep + v.size
+        np.multiply(v, SCALE, out=self.buf[self.n:end])
+        self.n = end # publish only after the samples are written (see LevelMeter)
+
+    def view(self, start=0, end=None):
+        start = max(start, self.offset) - self.offset
+        return self.buf[start:self.n if end is None else end - self.offset]
+
+def mean_level(x):
+    # Mean |sample| in int16 units, the scale the old per-chunk meter used
+    return float(np.abs(x).mean()) * 32768 if x.size else 0.0
+
+def speech_bounds(x, level, frame_ms=20, hangover_ms=300, min_speech_ms=120, rate=RATE):
+    # (start, end) of x with leading/trailing silence cut, or None if fewer than
+    # min_speech_ms of frames reach `level` (mean |int16| per frame). The hangover
+    # keeps soft onsets and word endings that sit just under the threshold.
+    f = int(rate * frame_ms / 1000)
+    n = x.size // f
+    if n == 0: return None
+    energy = np.abs(x[:n * f]).reshape(n, f).mean(axis=1)
+    voiced = np.flatnonzero(energy >= level / 32768)
+    if voiced.size * frame_ms < min_speech_ms: return None
+    pad = int(rate * hangover_ms / 1000)
+    return max(0, voiced[0] * f - pad), min(x.size, (voiced[-1] + 1) * f + pad)
+
+# METERING
+# Single producer (capture thread appends to the PCMBuffer, then publishes the
+# new write index) / single consumer (UI frame). The consumer reads the index
+# first and only looks at samples below it, so no lock is needed; levels are
+# computed once per UI frame over a fixed window, not once per audio chunk.
+class LevelMeter:
+    def __init__(self, buffer, window_ms=50, rate=RATE):
+        self.buffer = buffer
+        self.window = int(window_ms * rate / 1000)
+        self.seen = -1
+        self.snapshot = (0.0, 0.0) # (rms, peak), full scale = 1.0
+
+    def read(self):
+        n = self.buffer.n
+        if n != self.seen:
+            self.seen = n
+            x = self.buffer.buf[max(0, n - self.window):n]
+            self.snapshot = (float(np.sqrt(np.dot(x, x) / x.size)), float(np.abs(x).max())) if x.size else (0.0, 0.0)
+        return self.snapshot
+
+# AUDIO SOURCES
+# Every source hands out int16 mono chunks: read() returns bytes, b"" when
+# nothing arrived within the timeout, and None once a replay has run out.
+PA_INT16 = 8 # pyaudio.paInt16, without importing PortAudio here
+
+def read_wav(path, rate=RATE):
+    # Any 16-bit WAV; mixed down to mono and resampled to `rate` if needed
+    with wave.open(path, "rb") as wf:
+        ch, width, src_rate = wf.getnchannels(), wf.getsampwidth(), wf.getframerate()
+        raw = wf.readframes(wf.getnframes())
+    if width != 2: raise ValueError(f"{path}: only 16-bit PCM is supported")
+    v = np.frombuffer(raw, dtype=np.int16)
+    if ch > 1: v = v.reshape(-1, ch).mean(axis=1).astype(np.int16)
+    if src_rate != rate:
+        x = np.arange(0, v.size, src_rate / rate)
+        v = np.interp(x, np.arange(v.size), v).astype(np.int16)
+    return v.tobytes()
+
+def preroll_start(chunks, level):
+    # Index of the chunk just before the first one at or above `level` (mean |int16|),
+    # len(chunks) when the whole pre-roll is silence
+    for i, data in enumerate(chunks):
+        if np.abs(np.frombuffer(data, dtype=np.int16)).mean() >= level: return max(0, i - 1)
+    return len(chunks)
+
+# Microphone via PortAudio in callback mode: PortAudio's own thread fills a
+# queue, so a busy CPU delays the consumer instead of overflowing the device.
+# With preroll_ms the stream is opened once (arm()) and stays open: between
+# takes the callback only rotates the last preroll_ms of audio through a ring,
+# and start() hands its voiced part to the take, so the first syllable said
+# together with the key press is kept and no take pays for a device open.
+class PortAudioSource:
+    def __init__(self, chunk=CHUNK, rate=RATE, device=None, pa=None, preroll_ms=0, preroll_level=300):
+        self.chunk = chunk
+        self.rate = rate
+        self.device = device
+        self.pa = pa
+        self.stream = None
+        self.q = queue.Queue()
+        self.capturing = False
+        self.lock = threading.Lock()
+        self.ring = deque(maxlen=max(1, round(preroll_ms / 1000 * rate / chunk))) if preroll_ms else None
+        self.preroll_level = preroll_level
+        self.preroll_samples = 0 # prepended to the last take
+
+    def _callback(self, data, frames, time_info, status):
+        with self.lock:
+            if self.capturing: self.q.put(data)
+            elif self.ring is not None: self.ring.append(data)
+        return (None, 0) # paContinue
+
+    def _open(self):
+        if self.pa is None:
+            import pyaudio
+            self.pa = pyaudio.PyAudio()
+        self.stream = self.pa.open(format=PA_INT16, channels=1, rate=self.rate, input=True,
+                                   input_device_index=self.device, frames_per_buffer=self.chunk,
+                                   stream_callback=self._callback)
+        self.stream.start_stream()
+
+    def arm(self):
+        if self.ring is not None and self.stream is None: self._open()
+
+    def start(self):
+        q = queue.Queue()
+        with self.lock:
+            self.preroll_samples = 0
+            if self.ring:
+                pre = list(self.ring)[preroll_start(self.ring, self.preroll_level):]
+                for data in pre: q.put(data)
+                self.preroll_samples = sum(len(d) for d in pre) // 2
+                self.ring.clear()
+            self.q = q
+            self.capturing = True
+        if self.stream is None: self._open()
+
+    def read(self, timeout=0.5):
+        try: return self.q.get(timeout=timeout)
+        except queue.Empty: return b""
+
+    def stop(self):
+        with self.lock: self.capturing = False
+        if self.ring is None: self.close()
+
+    def close(self):
+        if self.stream:
+            self.stream.stop_stream(); self.stream.close()
+            self.stream = None
+
+# Replays PCM as if it came from the mic, optionally paced at 1x. Used for
+# profiling and load tests on machines without audio hardware.
+class ReplaySource:
+    def __init__(self, pcm=b"", chunk=CHUNK, rate=RATE, realtime=False):
+        self.chunk = chunk
+        self.rate = rate
+        self.realtime = realtime
+        self.load(pcm)
+
+    def load(self, pcm):
+        self.pcm = pcm
+        self.pos = 0
+
+    def start(self):
+        self.pos = 0
+        self.t0 = time.perf_counter()
+
+    def read(self, timeout=0.5):
+        if self.pos >= len(self.pcm): return None
+        data = self.pcm[self.pos:self.pos + self.chunk * 2]
+        self.pos += len(data)
+        if self.realtime:
+            ahead = self.t0 + self.pos / 2 / self.rate - time.perf_counter()
+            if ahead > 0: time.sleep(ahead)
+        return data
+
+    def stop(self): pass
+
+class FileSource(ReplaySource):
+    def __init__(self, path, chunk=CHUNK, rate=RATE, realtime=True):
+        super().__init__(read_wav(path, rate), chunk, rate, realtime)
+
+# Deterministic speech-like signal: voiced tone bursts separated by pauses
+class SyntheticSource(ReplaySource):
+    def __init__(self, seconds=20, chunk=CHUNK, rate=RATE, realtime=True, seed=0):
+        rng = np.random.default_rng(seed)
+        out, n = [], int(seconds * rate)
+        while sum(a.size for a in out) < n:
+            burst = int(rng.uniform(0.8, 3.0) * rate)
+            t = np.arange(burst) / rate
+            f0 = rng.uniform(100, 220)
+            tone = np.sin(2 * np.pi * f0 * t) + 0.5 * np.sin(4 * np.pi * f0 * t)
+            out.append(tone * np.hanning(burst) * rng.uniform(3000, 9000))
+            out.append(rng.normal(0, 30, int(rng.uniform(0.2, 0.8) * rate)))
+        pcm = np.concatenate(out)[:n].astype(np.int16).tobytes()
+        super().__init__(pcm, chunk, rate, realtime)
+
+def make_source(config):
+    chunk = int(config.get("audio_chunk", CHUNK))
+    backend = config.get("audio_backend", "portaudio")
+    if backend == "file":
+        return FileSource(os.path.expanduser(config["audio_file"]), chunk, realtime=config.get("audio_realtime", True))
+    if backend == "synthetic":
+        return SyntheticSource(config.get("audio_synthetic_seconds", 20), chunk, realtime=config.get("audio_realtime", True))
+    return PortAudioSource(chunk, device=config.get("audio_device"), preroll_ms=config.get("audio_preroll_ms", 0),
+                           preroll_level=config.get("audio_preroll_level", 300))
@@ -0,0 +1,226 @@
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from brtn_audio import RATE
+from brtn_worker import load_model, transcribe_batch, BATCH_CLIP_SECONDS
+from brtn_cache import TranscriptCache, CACHE_PATH, file_digest, audio_digest
+from brtn_archive import ARCHIVE_DIR, load_take
+from brtn_config import load_config, decode_profile, decode_options, DECODE_PROFILES
+from brtn_sched import batch_plan
+
+# Headless batch transcription: ./brtn.sh transcribe meetings/ "calls/**/*.m4a" -j 4 -f txt,srt
+AUDIO_EXTS = {".wav", ".flac", ".mp3", ".m4a", ".mp4", ".ogg", ".opus", ".webm", ".aac"}
+FORMATS = ("txt", "json", "srt")
+ARCHIVE_PREFIX = "archive:" # archive:<take id> re-decodes a take kept by brtn_archive
+
+# Per-process model, loaded once by the pool initializer
+_model = None
+_options = None
+_cache = None
+_cache_prefix = None
+_batch = 1
+_archive_path = ARCHIVE_DIR
+
+def _init(size, compute_type, threads, options, cache_path=None, cache_mb=0, num_workers=1, batch=1, nice=0,
+          archive_path=ARCHIVE_DIR):
+    global _model, _options, _cache, _cache_prefix, _batch, _archive_path
+    _archive_path = archive_path
+    # Below interactive dictation: the whole process, CTranslate2's threads included
+    if nice: os.nice(nice)
+    _model = load_model(size, compute_type, threads, num_workers)
+    _options = options
+    _batch = batch
+    if cache_path and cache_mb:
+        _cache = TranscriptCache(cache_path, cache_mb)
+        _cache_prefix = (size, compute_type)
+
+def expand(paths):
+    files = []
+    for p in paths:
+        if p.startswith(ARCHIVE_PREFIX):
+            files.append(p)
+        elif os.path.isdir(p):
+            for root, _, names in os.walk(p):
+                files += [os.path.join(root, n) for n in names if os.path.splitext(n)[1].lower() in AUDIO_EXTS]
+        elif os.path.isfile(p):
+            files.append(p)
+        else:
+            files += [f for f in glob.glob(p, recursive=True) if os.path.isfile(f)]
+    return sorted(dict.fromkeys(files))
+
+def srt_time(t):
+    ms = int(round(t * 1000))
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d},{ms % 1000:03d}"
+
+def _source(path):
+    # A file path for faster-whisper to open, or the PCM of an archived take
+    return load_take(path[len(ARCHIVE_PREFIX):], _archive_path) if path.startswith(ARCHIVE_PREFIX) else path
+
+def _digest(src):
+    # Files are keyed by their bytes: identical content hits regardless of name or path
+    return file_digest(src) if isinstance(src, str) else audio_digest(src)
+
+def write_outputs(path, outdir, formats, segments, info):
+    base = path[len(ARCHIVE_PREFIX):] if path.startswith(ARCHIVE_PREFIX) else os.path.splitext(os.path.basename(path))[0]
+    outdir = outdir or os.path.dirname(path)
+    os.makedirs(outdir or ".", exist_ok=True)
+    stem = os.path.join(outdir, base)
+    text = " ".join(s["text"] for s in segments).strip()
+    if "txt" in formats:
+        with open(stem + ".txt", "w") as f: f.write(text + "\n")
+    if "json" in formats:
+        with open(stem + ".json", "w") as f:
+            json.dump({"file": path, "language": info["language"], "duration": info["duration"],
+                       "text": text, "segments": segments}, f, indent=2)
+    if "srt" in formats:
+        with open(stem + ".srt", "w") as f:
+            for i, s in enumerate(segments, 1):
+                f.write(f"{i}\n{srt_time(s['start'])} --> {srt_time(s['end'])}\n{s['text'].strip()}\n\n")
+
+def transcribe_file(path, outdir, formats):
+    t = time.time()
+    src = _source(path)
+    key = _cache and TranscriptCache.key(_digest(src), *_cache_prefix, **_options)
+    hit = _cache.get(key) if _cache else None
+    if hit:
+        segs, info = hit["segments"], hit["info"]
+    else:
+        segments, info = _model.transcribe(src, **_options)
+        segs = [{"start": s.start, "end": s.end, "text": s.text} for s in segments]
+        info = {"language": info.language, "duration": info.duration}
+        if _cache: _cache.put(key, {"segments": segs, "info": info})
+    elapsed = time.time() - t
+    write_outputs(path, outdir, formats, segs, info)
+    return info["duration"], elapsed, bool(hit)
+
+def transcribe_group(paths, outdir, formats):
+    # --batch-size: short files (one Whisper window each) are decoded together in
+    # one batched pass; longer ones are split into windows batched within the file.
+    # -> [(path, duration, elapsed, hit or error)]
+    from faster_whisper import BatchedInferencePipeline, decode_audio
+    t = time.time()
+    options = {**_options, "batch_size": _batch} # batched output can differ slightly, keep it apart in the cache
+    results, short = {}, []
+    for path in paths:
+        try:
+            src = _source(path)
+            key = _cache and TranscriptCache.key(_digest(src), *_cache_prefix, **options)
+            hit = _cache.get(key) if _cache else None
+            if hit:
+                results[path] = (hit["segments"], hit["info"], True)
+                continue
+            audio = decode_audio(src) if isinstance(src, str) else src
+            if audio.size <= BATCH_CLIP_SECONDS * RATE:
+                short.append((path, key, audio))
+                continue
+            segments, info = BatchedInferencePipeline(_model).transcribe(audio, batch_size=_batch, **_options)
+            segs = [{"start": s.start, "end": s.end, "text": s.text} for s in segments]
+            results[path] = (segs, {"language": info.language, "duration": info.duration}, False)
+            if _cache: _cache.put(key, {"segments": segs, "info": results[path][1]})
+        except Exception as e:
+            results[path] = e
+    if short:
+        decoded = transcribe_batch(_model, [a for _, _, a in short], **_options)
+        for (path, key, audio), (segments, info) in zip(short, decoded):
+            segs = [{"start": s.start, "end": s.end, "text": s.text} for s in segments]
+            info = {"language": info.language, "duration": audio.size / RATE}
+            results[path] = (segs, info, False)
+            if _cache: _cache.put(key, {"segments": segs, "info": info})
+    # A batch shares one decode, so its wall time is split over the files by duration
+    elapsed = time.time() - t
+    total = sum(r[1]["duration"] for r in results.values() if not isinstance(r, Exception)) or 1e-6
+    out = []
+    for path in paths:
+        r = results[path]
+        if isinstance(r, Exception):
+            out.append((path, 0.0, 0.0, r))
+            continue
+        segs, info, hit = r
+        write_outputs(path, outdir, formats, segs, info)
+        out.append((path, info["duration"], elapsed * info["duration"] / total, hit))
+    return out
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="brtn transcribe", description="Transcribe audio files with a pool of worker processes")
+    ap.add_argument("paths", nargs="+", help="files, directories, glob patterns or archive:<take id>")
+    ap.add_argument("-j", "--jobs", type=int, default=0, help="worker processes (default: free cores / threads)")
+    ap.add_argument("-t", "--threads", type=int, default=0, help="cpu_threads per worker (default: performance cores, max 4)")
+    ap.add_argument("--nice", type=int, default=10, help="lower the workers' CPU priority by this much (0 = off)")
+    ap.add_argument("-o", "--outdir", default=None, help="output directory (default: next to each input)")
+    ap.add_argument("-f", "--format", default="txt", help="comma separated: txt,json,srt")
+    ap.add_argument("--profile", default=None, choices=sorted(DECODE_PROFILES),
+                    help="decode profile (default: the one in ~/.brtn_config.json)")
+    ap.add_argument("--model", default=None, help="overrides the profile's model")
+    ap.add_argument("--compute-type", default=None)
+    ap.add_argument("--language", default=None, help="language code or 'auto'")
+    ap.add_argument("--beam-size", type=int, default=None)
+    ap.add_argument("--cache", default=None, help="transcript cache file (default: cache_path from the config)")
+    ap.add_argument("--cache-mb", type=float, default=None,
+                    help="cache size limit in MB (default: cache_max_mb from the config, shared with dictation)")
+    ap.add_argument("--no-cache", action="store_true", help="always decode, don't read or write the cache")
+    ap.add_argument("-b", "--batch-size", type=int, default=1,
+                    help="decode up to N short files (or N windows of a long one) per batched pass")
+    args = ap.parse_args(argv)
+
+    formats = {f.strip() for f in args.format.split(",") if f.strip()}
+    bad = formats - set(FORMATS)
+    if bad: ap.error(f"unknown format(s): {', '.join(sorted(bad))}")
+    files = expand(args.paths)
+    if not files: ap.error("no audio files found")
+
+    config = load_config()
+    if args.profile: config = {**config, "decode_profile": args.profile}
+    errors = []
+    profile = decode_profile(config, errors)
+    for e in errors: print(f"config: {e}", file=sys.stderr)
+    flags = {"model": args.model, "compute_type": args.compute_type, "language": args.language, "beam_size": args.beam_size}
+    profile.update({k: v for k, v in flags.items() if v is not None})
+    args.model, args.compute_type = profile["model"], profile["compute_type"]
+
+    jobs, threads = batch_plan(len(files), args.threads, args.jobs)
+    options = decode_options(profile)
+    batch = max(1, args.batch_size)
+    print(f"{len(files)} file(s), {jobs} worker(s) x {threads} thread(s), model {args.model}/{args.compute_type}, "
+          f"{profile['name']} profile" + (f", batches of {batch}" if batch > 1 else ""), file=sys.stderr)
+
+    t = time.time()
+    audio = 0.0
+    failed = 0
+    cached = 0
+    cache_mb = config.get("cache_max_mb", 64) if args.cache_mb is None else args.cache_mb
+    cache = (None, 0) if args.no_cache else (os.path.expanduser(args.cache or config.get("cache_path") or CACHE_PATH), cache_mb)
+    initargs = (args.model, args.compute_type, threads, options, *cache, profile["num_workers"], batch, args.nice,
+                config.get("archive_path") or ARCHIVE_DIR)
+    with ProcessPoolExecutor(jobs, initializer=_init, initargs=initargs) as pool:
+        if batch > 1:
+            groups = [files[i:i + batch] for i in range(0, len(files), batch)]
+            futures = {pool.submit(transcribe_group, g, args.outdir, formats): g for g in groups}
+        else:
+            futures = {pool.submit(transcribe_file, f, args.outdir, formats): [f] for f in files}
+        for fut in as_completed(futures):
+            try:
+                results = fut.result()
+                if batch == 1: results = [(futures[fut][0], *results)]
+            except Exception as e:
+                results = [(path, 0.0, 0.0, e) for path in futures[fut]]
+            for path, duration, elapsed, hit in results:
+                if isinstance(hit, Exception):
+                    failed += 1
+                    print(f"{path}: FAILED {hit}", file=sys.stderr)
+                    continue
+                audio += duration
+                cached += hit
+                print(f"{path}: {duration:.1f}s audio in {elapsed:.1f}s (RTF {elapsed / max(duration, 1e-6):.3f})"
+                      + (" [cached]" if hit else ""))
+    wall = time.time() - t
+    print(f"Done: {len(files) - failed}/{len(files)} file(s), {audio:.1f}s audio in {wall:.1f}s (RTF {wall / max(audio, 1e-6):.3f})", file=sys.stderr)
+    if not args.no_cache:
+        print(f"Cache: {cached} hit(s), {len(files) - failed - cached} miss(es)", file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
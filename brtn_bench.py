@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import time
+import glob
+import queue
+import argparse
+import platform
+import resource
+import threading
+import subprocess
+import numpy as np
+from brtn_audio import ReplaySource, read_wav
+from brtn_config import DEFAULT_CONFIG, DECODE_PROFILES, auto_threads
+from brtn_output import make_sink
+from brtn_sched import topology, load_average, on_battery
+
+# End-to-end dictation benchmark: replays a fixed corpus of WAV fixtures through
+# Engine with a replayed microphone and a fake paste sink, then reports p50/p95 per
+# stage, RTF and peak RSS for every model size x compute_type. Each combination
+# runs in its own process so peak RSS is not polluted by the previous model.
+#
+#   python brtn_bench.py --corpus bench/fixtures --models tiny,base --compute-types int8,float32
+STAGES = ("buffering", "decode", "vad", "beam_search", "output", "latency")
+# Must stay out of the front end's import graph (loaded in the background or by the worker)
+HEAVY_MODULES = ("numpy", "pyaudio", "faster_whisper", "ctranslate2", "pynput", "pyperclip", "AppKit")
+
+class FakeUI:
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.meter = None
+
+class FakeSink:
+    name = "fake"
+
+    def __init__(self):
+        self.texts = []
+
+    def __call__(self, text):
+        self.texts.append(text)
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024) # bytes on macOS, KB on Linux
+
+def summarize(values):
+    a = np.asarray(values, dtype=np.float64)
+    if a.size == 0: return None
+    return {"p50": float(np.percentile(a, 50)), "p95": float(np.percentile(a, 95)), "mean": float(a.mean())}
+
+def run_config(files, size, compute_type, threads, streaming, realtime, repeat, sink="fake", profile="balanced"):
+    from brtn_engine import Engine
+    from brtn_worker import load_model, warm_up
+    t = time.perf_counter()
+    model = load_model(size, compute_type, threads)
+    warm_up(model)
+    load_time = time.perf_counter() - t
+
+    # The cache stays off so repeats measure decoding, not lookups; fixtures stay out of the history
+    config = {**DEFAULT_CONFIG, "streaming": streaming, "model_tiers": [size], "output_sink": sink,
+              "output_file": os.devnull, "cache_max_mb": 0, "history": False, "decode_profile": profile,
+              "decode_overrides": {"model": size, "compute_type": compute_type, "cpu_threads": threads}}
+    source, done = ReplaySource(realtime=realtime), threading.Event()
+    out = FakeSink() if sink == "fake" else make_sink(config)
+    engine = Engine(FakeUI(), config, source=source, paste=out, model=model)
+    last = {}
+    engine.on_done = lambda stats: (last.update(stats=stats), done.set())
+    takes = []
+    for _ in range(repeat):
+        for path in files:
+            source.load(read_wav(path))
+            done.clear()
+            engine.start()
+            if not done.wait(600): raise TimeoutError(f"{path}: engine did not finish")
+            s = last["stats"]
+            audio = s.get("audio_seconds", 0) or 1e-9
+            takes.append({"file": os.path.basename(path), "audio_seconds": s.get("audio_seconds", 0),
+                          "trimmed_seconds": s.get("trimmed", 0.0), "sched": s.get("sched"),
+                          "rtf": (s.get("vad", 0) + s.get("beam_search", 0)) / audio,
+                          **{k: s.get(k, 0.0) for k in STAGES}})
+    return {"model": size, "compute_type": compute_type, "cpu_threads": threads, "profile": profile,
+            "streaming": streaming, "sink": sink,
+            "realtime": realtime, "takes": len(takes), "load_seconds": load_time,
+            "stages": {k: summarize([t[k] for t in takes]) for k in STAGES},
+            "rtf": summarize([t["rtf"] for t in takes]), "peak_rss_mb": peak_rss_mb(), "per_take": takes}
+
+def import_profile(module):
+    # `python -X importtime`: cumulative microseconds for the module and every package it drags in
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                         capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    times = {}
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line: continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative) / 1000
+    if out.returncode: raise RuntimeError(out.stderr.strip().splitlines()[-1])
+    return times
+
+def check_import_budget(module, budget_ms):
+    times = import_profile(module)
+    total = times.get(module, 0.0)
+    heavy = [m for m in HEAVY_MODULES if m in times]
+    print(f"import {module}: {total:.0f} ms (budget {budget_ms:.0f} ms)", file=sys.stderr)
+    for name, ms in sorted(times.items(), key=lambda kv: -kv[1])[1:8]:
+        print(f"  {ms:8.1f} ms  {name}", file=sys.stderr)
+    for m in heavy: print(f"REGRESSION {module} imports {m} at startup", file=sys.stderr)
+    if total > budget_ms: print(f"REGRESSION import {module} {total:.0f} ms > {budget_ms:.0f} ms", file=sys.stderr)
+    return 1 if heavy or total > budget_ms else 0
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path) as f: base = json.load(f)
+    key = lambda r: (r["model"], r["compute_type"], r["streaming"], r.get("sink", "fake"), r.get("profile", "balanced"))
+    old = {key(r): r for r in base.get("runs", [])}
+    regressions = []
+    for r in results["runs"]:
+        b = old.get(key(r))
+        if not b: continue
+        for metric, new, prev in [("latency.p95", r["stages"]["latency"]["p95"], b["stages"]["latency"]["p95"]),
+                                  ("rtf.p50", r["rtf"]["p50"], b["rtf"]["p50"]),
+                                  ("peak_rss_mb", r["peak_rss_mb"], b["peak_rss_mb"])]:
+            if prev and new > prev * (1 + tolerance):
+                regressions.append(f"{r['model']}/{r['compute_type']}: {metric} {prev:.3f} -> {new:.3f}")
+    return regressions
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="BRTN end-to-end latency / RTF benchmark")
+    ap.add_argument("--corpus", default="bench/fixtures", help="directory of WAV fixtures")
+    ap.add_argument("--models", default="base")
+    ap.add_argument("--compute-types", default="int8")
+    ap.add_argument("--threads", type=int, default=0, help="cpu_threads (default: auto)")
+    ap.add_argument("--profile", default="balanced", help="decode profile for beam/VAD/timestamp options")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--no-streaming", action="store_true", help="decode the whole take after release")
+    ap.add_argument("--realtime", action="store_true", help="pace the fake microphone at 1x speed")
+    ap.add_argument("--sink", default="fake", help="output sink to time: fake | file | stdout | type | paste")
+    ap.add_argument("--out", default="bench_results.json")
+    ap.add_argument("--compare", default=None, help="baseline JSON; exit 1 on regressions")
+    ap.add_argument("--tolerance", type=float, default=0.2)
+    ap.add_argument("--import-budget", type=float, default=None, metavar="MS",
+                    help="only check that importing the front end stays under MS and skips heavy modules")
+    ap.add_argument("--import-module", default="brtn_transcriber")
+    ap.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.profile not in DECODE_PROFILES: ap.error(f"unknown profile {args.profile!r}")
+    if args.import_budget is not None:
+        return check_import_budget(args.import_module, args.import_budget)
+
+    if args.child:
+        spec = json.loads(args.child)
+        print(json.dumps(run_config(**spec)))
+        return 0
+
+    files = sorted(glob.glob(os.path.join(args.corpus, "*.wav")))
+    if not files: ap.error(f"no WAV fixtures in {args.corpus}")
+    runs = []
+    for size in [m.strip() for m in args.models.split(",") if m.strip()]:
+        for ct in [c.strip() for c in args.compute_types.split(",") if c.strip()]:
+            spec = {"files": files, "size": size, "compute_type": ct, "threads": args.threads or auto_threads(),
+                    "profile": args.profile,
+                    "streaming": not args.no_streaming, "realtime": args.realtime, "repeat": args.repeat,
+                    "sink": args.sink}
+            print(f"bench: {size}/{ct} over {len(files)} fixture(s) x {args.repeat}", file=sys.stderr)
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", json.dumps(spec)],
+                                 capture_output=True, text=True)
+            if out.returncode:
+                print(out.stderr, file=sys.stderr)
+                continue
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            lat = r["stages"]["latency"]
+            print(f"  latency p50 {lat['p50'] * 1000:.0f} ms, p95 {lat['p95'] * 1000:.0f} ms, "
+                  f"RTF p50 {r['rtf']['p50']:.3f}, peak RSS {r['peak_rss_mb']:.0f} MB", file=sys.stderr)
+            runs.append(r)
+
+    results = {"meta": {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "host": platform.node(),
+                        "platform": platform.platform(), "python": platform.python_version(),
+                        "cpu_count": os.cpu_count(), "topology": topology(), "load_average": load_average(),
+                        "on_battery": on_battery(), "corpus": [os.path.basename(f) for f in files]},
+               "runs": runs}
+    with open(args.out, "w") as f: json.dump(results, f, indent=2)
+    print(f"bench: wrote {args.out}", file=sys.stderr)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for r in regressions: print(f"REGRESSION {r}", file=sys.stderr)
+        if regressions: return 1
+    return 0 if runs else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
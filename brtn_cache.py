@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from brtn_metrics import METRICS, log
+
+# TRANSCRIPTION CACHE
+# Results keyed by a hash of the audio plus everything that changes the decode
+# (model, compute_type, language, beam size, prompt ...). A hit skips
+# WhisperModel.transcribe entirely. Entries live in one SQLite file, shared by
+# the engine and batch runs. Once it grows past max_mb a background thread drops
+# the least recently used ones in small transactions, so put() stays one insert.
+CACHE_PATH = "~/.brtn_cache.sqlite"
+EVICT_BATCH = 64 # entries deleted per transaction
+EVICT_TO = 0.9 # eviction stops at this fraction of max_mb, so the next put doesn't start another pass
+
+def audio_digest(data):
+    # data: ndarray (the float32 PCM handed to the model) or raw file bytes
+    h = hashlib.blake2b(digest_size=20)
+    h.update(memoryview(data).cast("B") if not isinstance(data, bytes) else data)
+    return h.hexdigest()
+
+def file_digest(path, block=1 << 20):
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for b in iter(lambda: f.read(block), b""): h.update(b)
+    return h.hexdigest()
+
+class TranscriptCache:
+    def __init__(self, path=CACHE_PATH, max_mb=64):
+        self.path = os.path.expanduser(path)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicting = False
+        # Batch workers are separate processes on the same file: WAL + a busy timeout
+        self.db = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                        "size INTEGER NOT NULL, atime REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_atime ON entries (atime)")
+
+    @staticmethod
+    def key(digest, model, compute_type, **options):
+        opts = json.dumps(options, sort_keys=True, default=str)
+        return hashlib.blake2b(f"{digest}|{model}|{compute_type}|{opts}".encode(), digest_size=20).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            row = self.db.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                METRICS.inc("cache_misses_total")
+                return None
+            self.db.execute("UPDATE entries SET atime = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        METRICS.inc("cache_hits_total")
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        blob = json.dumps(value)
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", (key, blob, len(blob), time.time()))
+            evict = not self.evicting and self.size() > self.max_bytes
+            if evict: self.evicting = True
+        if evict: threading.Thread(target=self._evict, daemon=True).start()
+
+    def size(self):
+        # Bytes in use, from the page counts: constant time, and it sees what other processes wrote
+        pages, free, page = (self.db.execute(f"PRAGMA {p}").fetchone()[0] for p in ("page_count", "freelist_count", "page_size"))
+        return (pages - free) * page
+
+    def _evict(self):
+        # Oldest first; the lock is dropped between transactions so lookups go on meanwhile
+        dropped = 0
+        try:
+            while True:
+                with self.lock, self.db:
+                    if self.size() <= self.max_bytes * EVICT_TO: break
+                    self.db.execute("BEGIN")
+                    keys = self.db.execute("SELECT key FROM entries ORDER BY atime LIMIT ?", (EVICT_BATCH,)).fetchall()
+                    if not keys: break
+                    self.db.executemany("DELETE FROM entries WHERE key = ?", keys)
+                    dropped += len(keys)
+        except sqlite3.Error as e:
+            log(f"CACHE: Eviction failed ({e})")
+        finally:
+            self.evicting = False
+        METRICS.inc("cache_evictions_total", dropped)
+
+    def stats(self):
+        with self.lock:
+            n, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            return {"entries": n, "bytes": size, "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self.lock:
+            self.db.execute("DELETE FROM entries")
+            self.db.execute("VACUUM")
+
+def open_cache(config):
+    # None when disabled (cache_max_mb 0) or the file can't be opened
+    if not config.get("cache_max_mb", 64): return None
+    try:
+        return TranscriptCache(config.get("cache_path") or CACHE_PATH, config.get("cache_max_mb", 64))
+    except sqlite3.Error as e:
+        log(f"CACHE: Disabled ({e})")
+        return None
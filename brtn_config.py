@@ -1,5 +1,7 @@
 import json
 import os
+import threading
+from brtn_metrics import log
 
 CONFIG_PATH = os.path.expanduser("~/.brtn_config.json")
 
@@ -11,12 +13,140 @@ DEFAULT_CONFIG = {
     "end_key_code": 63,
     "end_key_name": "Fn",
     "show_icon": True,
-    "max_record_seconds": 27, # 90% of ~30s whisper window
+    "max_record_seconds": 0, # hard stop for a take, 0 = no limit (long-form)
+    "buffer_seconds": 30, # RAM window; older, already decoded audio is dropped
+    "buffer_spill_seconds": 300, # undecoded audio past this is paged to a temp file, 0 = always RAM
+    "streaming": True, # decode finished chunks while the key is still held
+    "stream_chunk_seconds": 5, # min audio before a chunk may be cut
+    "stream_silence_ms": 400, # pause length that closes a chunk
+    "stream_overlap_seconds": 1.0, # audio repeated at the start of each chunk
+    "trim_level": 200, # cut leading/trailing audio quieter than this (mean |int16|) before decoding, 0 = off
+    "trim_hangover_ms": 300, # audio kept around the first/last frame above trim_level
+    "live_typing": False, # type confirmed words into the focused app while dictating
+    "live_interval_seconds": 1.0, # how often the open chunk is re-decoded for live_typing
+    "input_backend": "quartz", # quartz (event tap) | poll (10 ms key-state fallback)
+    "audio_backend": "portaudio", # portaudio | file | synthetic (replay for headless profiling)
+    "audio_chunk": 1024, # frames per PortAudio callback
+    "audio_device": None, # PortAudio input device index, None = system default
+    "audio_preroll_ms": 0, # opt-in: keep the mic open and prepend this much audio from before the key press (e.g. 300); 0 = open per take
+    "audio_preroll_level": 300, # pre-roll starts one chunk before the first with mean |int16| above this
+    "audio_file": "", # WAV replayed by the "file" backend
+    "audio_realtime": True, # pace replay backends at 1x
+    "decode_profile": "balanced", # fast | balanced | accurate, see DECODE_PROFILES
+    "decode_overrides": {}, # per-field tweaks on top of the profile, e.g. {"cpu_threads": 6}
+    "decode_workers": 1, # takes decoded in parallel; pair with num_workers in decode_overrides
+    "batch_max": 1, # >1: unprompted clips from concurrent decode workers share one batched pass (needs decode_workers > 1)
+    "batch_wait_ms": 50, # how long a clip waits for others to join its batch
+    "max_pending_takes": 3, # takes waiting for a decode worker before new ones are refused
+    "cancel_key_code": 0, # opt-in: drops the current and all undelivered takes; seen in every app, so use a spare key (not Esc, 53)
+    "model_tiers": [], # fast -> accurate, e.g. ["base", "large-v3-turbo"]; empty = the profile's model
+    "tier_short_seconds": 8, # takes up to this long (the whole take, not a streamed chunk) decode on the first tier
+    "tier_min_logprob": -0.8, # escalate to the next tier below this mean avg_logprob
+    "resident_models": 2, # model sizes kept loaded at once (LRU)
+    "history": True, # keep delivered takes (text + timings) searchable with ./brtn.sh history
+    "history_path": "~/.brtn_history.sqlite",
+    "history_max_days": 365, # older takes are rotated out, 0 = keep
+    "history_max_mb": 50, # oldest takes go first past this size, 0 = unbounded
+    "archive": "", # flac | opus: keep every take's audio for re-transcription (needs ffmpeg), "" = off
+    "archive_path": "~/.brtn_archive",
+    "archive_segment_seconds": 600, # takes are packed into segment files of about this much audio
+    "archive_max_mb": 2048, # oldest segments are deleted past this
+    "idle_unload_minutes": 20, # free the model after this long without a take, 0 = keep it resident
+    "idle_model": "", # downgrade to this size instead of unloading, e.g. "tiny"
+    "unload_on_pressure": True, # also free it early when the OS reports memory pressure...
+    "pressure_idle_minutes": 2, # ...but only after this long without a take
+    "output_sink": "paste", # paste | type | file | stdout
+    "output_file": "", # used by the file sink
+    "paste_method": "cgevent", # cgevent (in-process Cmd+V) | osascript (layout-aware, slower)
+    "clipboard_restore": True, # put the previous clipboard text back after pasting
+    "paste_ready_timeout_ms": 300, # max wait for modifiers to be released before delivering
+    "cache_path": "~/.brtn_cache.sqlite", # transcripts keyed by audio hash + decode options
+    "cache_max_mb": 64, # LRU size limit of the cache file, 0 = no cache
+    "metrics_port": 0, # >0 serves /metrics, /metrics.json and /trace.json on localhost
+    "trace_path": "", # Chrome trace written here on exit
+    "use_worker": False, # decode in the shared brtn_worker.py process
+    "worker_socket": "~/.brtn_worker.sock",
     "theme_color_primary": "#EA6363",
     "theme_color_text": "#565656",
     "theme_color_accent": "#212121"
 }
 
+# DECODE PROFILES
+# Named speed/quality presets for load_model() and WhisperModel.transcribe().
+# cpu_threads 0 means auto-detect; language "auto" lets Whisper detect it.
+MODEL_SIZES = ("tiny", "tiny.en", "base", "base.en", "small", "small.en", "medium", "medium.en",
+               "large-v1", "large-v2", "large-v3", "large-v3-turbo", "turbo", "distil-large-v3")
+COMPUTE_TYPES = ("int8", "int8_float32", "int8_float16", "int16", "float16", "float32", "default")
+
+DECODE_PROFILES = {
+    "fast": {"model": "base", "compute_type": "int8", "cpu_threads": 0, "num_workers": 1, "beam_size": 1,
+             "language": "en", "vad_filter": True, "vad_threshold": 0.5, "vad_min_silence_ms": 500,
+             "vad_speech_pad_ms": 200, "without_timestamps": True, "condition_on_previous_text": False},
+    "balanced": {"model": "base", "compute_type": "int8", "cpu_threads": 0, "num_workers": 1, "beam_size": 1,
+                 "language": "en", "vad_filter": True, "vad_threshold": 0.5, "vad_min_silence_ms": 2000,
+                 "vad_speech_pad_ms": 400, "without_timestamps": False, "condition_on_previous_text": True},
+    "accurate": {"model": "large-v3-turbo", "compute_type": "int8", "cpu_threads": 0, "num_workers": 1,
+                 "beam_size": 5, "language": "en", "vad_filter": True, "vad_threshold": 0.5,
+                 "vad_min_silence_ms": 2000, "vad_speech_pad_ms": 400, "without_timestamps": False,
+                 "condition_on_previous_text": True},
+}
+
+PROFILE_CHECKS = {
+    "model": lambda v: isinstance(v, str) and (v in MODEL_SIZES or os.path.isdir(os.path.expanduser(v))),
+    "compute_type": lambda v: v in COMPUTE_TYPES,
+    "cpu_threads": lambda v: isinstance(v, int) and 0 <= v <= 256,
+    "num_workers": lambda v: isinstance(v, int) and 1 <= v <= 16,
+    "beam_size": lambda v: isinstance(v, int) and 1 <= v <= 10,
+    "language": lambda v: isinstance(v, str) and (v == "auto" or 2 <= len(v) <= 3),
+    "vad_filter": lambda v: isinstance(v, bool),
+    "vad_threshold": lambda v: isinstance(v, (int, float)) and 0 < v < 1,
+    "vad_min_silence_ms": lambda v: isinstance(v, int) and 0 <= v <= 10000,
+    "vad_speech_pad_ms": lambda v: isinstance(v, int) and 0 <= v <= 2000,
+    "without_timestamps": lambda v: isinstance(v, bool),
+    "condition_on_previous_text": lambda v: isinstance(v, bool),
+}
+
+def auto_threads():
+    # Performance cores only (E-cores slow every CTranslate2 thread down to their
+    # pace), leaving a core for capture and the UI when there are no E-cores for
+    # it; CTranslate2 gains little past 8 threads
+    from brtn_sched import topology
+    topo = topology()
+    n = topo["performance"] if topo["performance"] < topo["logical"] else topo["logical"] - 1
+    return max(1, min(8, n))
+
+def check_profile(profile):
+    errors = [f"{k}: invalid value {profile[k]!r}" for k, ok in PROFILE_CHECKS.items() if k in profile and not ok(profile[k])]
+    return errors + [f"{k}: unknown field" for k in profile if k not in PROFILE_CHECKS]
+
+def decode_profile(config, errors=None):
+    # The named profile plus decode_overrides. Invalid fields fall back to the
+    # profile's value and are reported through `errors`.
+    name = config.get("decode_profile", "balanced")
+    if name not in DECODE_PROFILES:
+        if errors is not None: errors.append(f"decode_profile: unknown profile {name!r}")
+        name = "balanced"
+    base = DECODE_PROFILES[name]
+    overrides = config.get("decode_overrides") or {}
+    bad = check_profile(overrides)
+    if errors is not None: errors += bad
+    profile = {**base, **{k: v for k, v in overrides.items() if k in PROFILE_CHECKS and PROFILE_CHECKS[k](v)}}
+    profile["name"] = name
+    if not profile["cpu_threads"]: profile["cpu_threads"] = auto_threads()
+    return profile
+
+def decode_options(profile):
+    # Keyword arguments for WhisperModel.transcribe()
+    options = {"beam_size": profile["beam_size"], "vad_filter": profile["vad_filter"],
+               "language": None if profile["language"] == "auto" else profile["language"],
+               "without_timestamps": profile["without_timestamps"],
+               "condition_on_previous_text": profile["condition_on_previous_text"]}
+    if profile["vad_filter"]:
+        options["vad_parameters"] = {"threshold": profile["vad_threshold"],
+                                     "min_silence_duration_ms": profile["vad_min_silence_ms"],
+                                     "speech_pad_ms": profile["vad_speech_pad_ms"]}
+    return options
+
 def load_config():
     if not os.path.exists(CONFIG_PATH):
         return DEFAULT_CONFIG
@@ -27,5 +157,49 @@ def load_config():
         return DEFAULT_CONFIG
 
 def save_config(config):
-    with open(CONFIG_PATH, 'w') as f:
+    # Write-then-rename, so a running ConfigWatcher never reads half a file
+    tmp = CONFIG_PATH + ".tmp"
+    with open(tmp, 'w') as f:
         json.dump(config, f, indent=4)
+    os.replace(tmp, CONFIG_PATH)
+
+# HOT RELOAD
+# One stat() per interval; on_change(config) runs on the watcher thread when the
+# file's mtime or size moves.
+class ConfigWatcher:
+    def __init__(self, on_change, path=CONFIG_PATH, interval=1.0):
+        self.on_change = on_change
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.last = self._stamp()
+
+    def _stamp(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            stamp = self._stamp()
+            if stamp == self.last: continue
+            try:
+                with open(self.path) as f: config = {**DEFAULT_CONFIG, **json.load(f)}
+            except (OSError, ValueError):
+                continue # missing or half-written: keep the running config, look again next tick
+            self.last = stamp
+            try: self.on_change(config)
+            except Exception as e: # one bad edit must not end hot reload for the session
+                log(f"CONFIG: Could not apply the new config ({e}).")
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+def changed(old, new, keys):
+    return any(old.get(k) != new.get(k) for k in keys)
@@ -0,0 +1,587 @@
+import os
+import gc
+import time
+import queue
+import threading
+from collections import namedtuple
+from brtn_config import load_config, decode_profile, decode_options, changed
+from brtn_audio import PCMBuffer, LevelMeter, RATE, make_source, mean_level, speech_bounds
+from brtn_worker import ModelPool, RemotePool, BatchScheduler, ensure_worker, resident_mb, memory_pressure
+from brtn_metrics import METRICS, log
+from brtn_output import make_sink, type_text
+from brtn_cache import TranscriptCache, audio_digest, open_cache
+from brtn_sched import DecodeScheduler
+from brtn_history import open_history
+from brtn_archive import open_archive
+
+# Streaming: a chunk is cut once it is long enough and ends in a pause
+SILENCE_LEVEL = 300 # mean |int16| below this counts as silence
+MAX_CHUNK_SECONDS = 25 # chunk + overlap stays inside the 30s window
+PROMPT_CHARS = 400 # carried-over context; Whisper keeps ~220 tokens of it anyway
+IDLE_POLL = 10 # seconds between idle / memory pressure checks
+
+# Hot reload: which config keys need what. RESTART_KEYS size the job queue and
+# its decode threads at startup and only log a notice; anything else is read per take.
+RESTART_KEYS = ("decode_workers", "max_pending_takes", "batch_max", "batch_wait_ms")
+LOAD_KEYS = ("model_tiers", "resident_models", "use_worker", "worker_socket")
+LOAD_FIELDS = ("model", "compute_type", "cpu_threads", "num_workers") # profile fields baked into a loaded model
+SOURCE_KEYS = ("audio_backend", "audio_chunk", "audio_device", "audio_file", "audio_realtime",
+               "audio_preroll_ms", "audio_preroll_level")
+SINK_KEYS = ("output_sink", "output_file", "paste_method", "clipboard_restore", "paste_ready_timeout_ms")
+CACHE_KEYS = ("cache_path", "cache_max_mb")
+HISTORY_KEYS = ("history", "history_path", "history_max_days", "history_max_mb")
+ARCHIVE_KEYS = ("archive", "archive_path", "archive_segment_seconds", "archive_max_mb")
+
+def _words(text):
+    return [w.strip(".,!?;:\"'").lower() for w in text.split()]
+
+def merge_overlap(prev, text, max_words=12, min_words=2):
+    # Chunks overlap by a second, so the new text may repeat the previous tail
+    a, b = _words(prev), _words(text)
+    for k in range(min(max_words, len(a), len(b)), min_words - 1, -1):
+        if a[-k:] == b[:k]: return " ".join(text.split()[k:])
+    return text
+
+def agreed_prefix(a, b):
+    # LocalAgreement: words two successive hypotheses share are treated as final
+    n = 0
+    for x, y in zip(_words(" ".join(a)), _words(" ".join(b))):
+        if x != y: break
+        n += 1
+    return n
+
+# DECODE PIPELINE
+# Every take is its own object with its own buffer, so a new recording never
+# touches audio that is still being decoded. start() puts the take on a
+# bounded job queue right away; capture then feeds it read-only Chunks, and one
+# of `decode_workers` threads drains them. Results are delivered strictly in
+# take order. A full queue refuses the new take (backpressure); cancel() drops
+# whatever has not been delivered yet.
+class Chunk(namedtuple("Chunk", "audio end")):
+    def __new__(cls, audio, end):
+        audio.flags.writeable = False # a view into the take buffer; decoders only read it
+        return super().__new__(cls, audio, end)
+
+class Take:
+    def __init__(self, seq, buffer_seconds, spill_seconds=300):
+        self.seq = seq
+        self.audio = PCMBuffer(buffer_seconds, spill_seconds=spill_seconds)
+        self.stats = {"buffering": 0.0, "vad": 0.0, "beam_search": 0.0, "t_start": time.perf_counter()}
+        self.chunks = queue.Queue() # Chunk ..., then None once capture has ended
+        self.parts = []
+        self.progress = 0 # end of the last decoded chunk, absolute samples
+        self.tier = None # first model tier for every chunk, set once the take's length is known (see _take_tier)
+        self.live = None # live_typing state, set if this take types as it goes
+        self.text = ""
+        self.cancelled = threading.Event()
+
+# The engine has no UI or Quartz dependency: ui only needs .queue and .meter,
+# and source / paste (an output sink) / model can be swapped for fakes (see brtn_bench.py).
+class Engine:
+    def __init__(self, ui, config=None, source=None, paste=None, model=None):
+        self.ui = ui
+        self.config = config or load_config()
+        self.own_source, self.own_paste = source is None, paste is None
+        self.source = source or make_source(self.config)
+        self.paste = paste or make_sink(self.config)
+        self.type_live = type_text # live_typing output, replaceable like paste
+        # profile/options/tiers/pool/model change together on reload, under swap_lock
+        self.swap_lock = threading.Lock()
+        self.generation = 0
+        self.profile, self.options, self.tiers, self.pool = self._decoder(self.config)
+        if model is not None: self.pool.put(self.tiers[0], model, pin=True)
+        self.model = model # first tier; set once it is ready to decode
+        self.cache = open_cache(self.config)
+        self.history = open_history(self.config)
+        self.archive = open_archive(self.config)
+        self.rec = False
+        self.take = None # the take being recorded
+        self.ui.meter = None
+        self.next_source = None
+        self.stats = {}
+        self.on_done = None
+        self.seq = 0
+        self.jobs = queue.Queue(maxsize=max(1, self.config.get("max_pending_takes", 3)))
+        self.pending = {} # seq -> take, started but not delivered
+        self.finished = {} # seq -> decoded take waiting for an earlier one
+        self.next_seq = 0
+        self.deliver_lock = threading.Lock() # pending/finished/next_seq; never held while outputting
+        self.delivering = False # a thread is in _deliver's output loop
+        self.batch_lock = threading.Lock()
+        self.batching = 0 # unprompted calls inside _transcribe, i.e. clips that may still join a batch
+        self.batcher = self._batcher(self.config)
+        self.sched = DecodeScheduler(self.profile["cpu_threads"], self.config.get("decode_workers", 1))
+        for _ in range(max(1, self.config.get("decode_workers", 1))):
+            threading.Thread(target=self._decode_worker, daemon=True).start()
+        self.last_used = time.monotonic() # last key press or delivery
+        self.idle = False # model freed or downgraded; the next key press reloads it
+        if model is None:
+            threading.Thread(target=self._load, args=(self.config, 0), daemon=True).start()
+            threading.Thread(target=self._idle_watch, daemon=True).start()
+        self._arm(self.source)
+
+    def _arm(self, source):
+        # Always-open mic for pre-roll; a failure here just means the first take opens it
+        if not hasattr(source, "arm"): return
+        try: source.arm()
+        except Exception as e: log(f"AUDIO: Could not pre-open the input ({e}).")
+
+    def _batcher(self, config):
+        # Batching only pays off when several workers decode at once on a local model
+        workers = max(1, config.get("decode_workers", 1))
+        if config.get("batch_max", 1) <= 1 or workers <= 1 or config.get("use_worker"): return None
+        return BatchScheduler(min(config["batch_max"], workers), config.get("batch_wait_ms", 50) / 1000,
+                              demand=lambda: self.batching)
+
+    def _decoder(self, config):
+        errors = []
+        profile = decode_profile(config, errors)
+        for e in errors: log(f"CONFIG: {e}")
+        tiers = list(config.get("model_tiers") or [profile["model"]])
+        pool = ModelPool(config.get("resident_models", 2), profile["compute_type"],
+                         profile["cpu_threads"], num_workers=profile["num_workers"])
+        return profile, decode_options(profile), tiers, pool
+
+    def _load(self, config, generation):
+        # Loads the first tier for `config`, then swaps the whole decoder in at once.
+        # Takes keep decoding on the previous model until then. True once swapped in.
+        try:
+            profile, options, tiers, pool = self._decoder(config) if generation else (self.profile, self.options, self.tiers, self.pool)
+            model = None
+            if config.get("use_worker"):
+                try:
+                    path = os.path.expanduser(config.get("worker_socket", "~/.brtn_worker.sock"))
+                    pool = RemotePool(ensure_worker(path, args=["--model", tiers[0], "--compute-type", profile["compute_type"],
+                                                                "--threads", str(profile["cpu_threads"]),
+                                                                "--workers", str(profile["num_workers"])]))
+                    model = pool.get(tiers[0])
+                    log("ENGINE: Using shared worker.")
+                except Exception as e:
+                    log(f"ENGINE: Worker unavailable ({e}), loading locally.")
+            if model is None:
+                model = pool.get(tiers[0], pin=True)
+                log(f"ENGINE: Model Loaded ({profile['name']} profile, {profile['compute_type']}, "
+                    f"{profile['cpu_threads']} threads).")
+        except Exception as e:
+            log(f"ENGINE: Model failed to load ({e}).")
+            METRICS.inc("errors_total")
+            with self.swap_lock:
+                # Nothing left to decode with: waiting takes fail (see _transcribe_tiers)
+                # and the next key press retries the load (see wake())
+                if generation == self.generation and not self.model: self.idle = True
+            return False
+        with self.swap_lock:
+            if generation != self.generation: return False # a newer reload superseded this one
+            self.profile, self.options, self.tiers, self.pool, self.model = profile, options, tiers, pool, model
+            self.sched.threads = profile["cpu_threads"]
+            self.idle = False
+        METRICS.set("process_resident_mb", resident_mb())
+        return True
+
+    # IDLE MEMORY
+    # After idle_unload_minutes without a take (or under OS memory pressure) the
+    # model is dropped, or swapped for the small idle_model. The first key press
+    # afterwards starts reloading it, so loading overlaps with recording instead
+    # of starting when the take is handed to the decoder.
+    def _idle_watch(self):
+        while True:
+            time.sleep(IDLE_POLL)
+            limit = self.config.get("idle_unload_minutes", 20) * 60
+            seen = self.last_used
+            if self.idle or not self.model or self.rec or self.pending or self.config.get("use_worker"): continue
+            idle = time.monotonic() - seen
+            try:
+                if limit and idle > limit: self._release(seen, "idle")
+                # Pressure alone is common on 8 GB machines; without a minimum idle time
+                # the model would be freed after every take and reloaded on every key press
+                elif (self.config.get("unload_on_pressure", True) and idle > self.config.get("pressure_idle_minutes", 2) * 60
+                      and memory_pressure()): self._release(seen, "memory pressure")
+            except Exception as e: # e.g. the idle_model can't be fetched offline; keep watching
+                log(f"ENGINE: Idle unload failed ({e}).")
+                METRICS.inc("errors_total")
+
+    def _release(self, seen, reason):
+        small = self.config.get("idle_model") or None
+        rss = resident_mb()
+        downgrade = None
+        if small == self.tiers[0]: return # already running on the idle model
+        if small:
+            config = {**self.config, "model_tiers": [small],
+                      "decode_overrides": {**self.config.get("decode_overrides", {}), "model": small}}
+            profile, options, tiers, pool = self._decoder(config)
+            if small in self.pool.resident(): pool.put(small, self.pool.get(small)) # an upper tier, reuse it
+            downgrade = (profile, options, tiers, pool, pool.get(small, pin=True))
+        with self.swap_lock:
+            # A key press since the check wins; it found the model still loaded
+            if self.last_used != seen or self.rec or self.pending: return
+            self.generation += 1 # drops any reload still in flight
+            if downgrade: self.profile, self.options, self.tiers, self.pool, self.model = downgrade
+            else:
+                self.pool.clear()
+                self.model = None
+            pool, self.idle = self.pool, True
+        gc.collect()
+        now = resident_mb()
+        log(f"ENGINE: {'Downgraded to ' + repr(small) if downgrade else 'Unloaded model'} ({reason}), "
+            f"freed {max(0.0, rss - now):.0f} MB.")
+        METRICS.inc("model_unloads_total")
+        METRICS.set("model_resident_mb", pool.footprint() if downgrade else 0)
+        METRICS.set("process_resident_mb", now)
+
+    def wake(self):
+        # Key down: mark activity and, if the model was freed, start loading it now
+        with self.swap_lock:
+            self.last_used = time.monotonic()
+            if not self.idle: return
+            self.idle = False
+            self.generation += 1
+            generation = self.generation
+        log("ENGINE: Reloading the model after idle.")
+        threading.Thread(target=self._reload, args=(generation,), daemon=True).start()
+
+    def _reload(self, generation):
+        t = time.perf_counter()
+        if not self._load(self.config, generation): return
+        METRICS.add_span("model_reload", t, time.perf_counter()) # -> model_reload_seconds
+        METRICS.inc("model_reloads_total")
+
+    def reconfigure(self, config):
+        # Hot reload from brtn_config.ConfigWatcher. Only model-affecting changes
+        # reload anything, and that happens in the background. Everything that can
+        # fail is built before anything is swapped, so a bad edit changes nothing.
+        old = self.config
+        profile = decode_profile(config)
+        source = make_source(config) if self.own_source and changed(old, config, SOURCE_KEYS) else None
+        paste = make_sink(config) if self.own_paste and changed(old, config, SINK_KEYS) else self.paste
+        cache = open_cache(config) if changed(old, config, CACHE_KEYS) else self.cache
+        history = open_history(config) if changed(old, config, HISTORY_KEYS) else self.history
+        archive = open_archive(config) if changed(old, config, ARCHIVE_KEYS) else self.archive
+        self.config, self.paste, self.cache, self.history, self.archive = config, paste, cache, history, archive
+        if source: self.next_source = source # swapped in by the next start()
+        restart = [k for k in RESTART_KEYS if old.get(k) != config.get(k)]
+        if restart: log(f"CONFIG: {', '.join(restart)} take effect after a restart.")
+        if changed(old, config, LOAD_KEYS) or any(profile[k] != self.profile[k] for k in LOAD_FIELDS):
+            with self.swap_lock:
+                self.generation += 1
+                generation = self.generation
+            log("CONFIG: Model settings changed, reloading in the background.")
+            threading.Thread(target=self._load, args=(config, generation), daemon=True).start()
+        elif profile != self.profile:
+            with self.swap_lock: self.profile, self.options = profile, decode_options(profile)
+            log(f"CONFIG: Decode options now '{profile['name']}'.")
+
+    def start(self):
+        self.wake()
+        if self.rec: return
+        if self.next_source:
+            if hasattr(self.source, "close"): self.source.close()
+            self.source, self.next_source = self.next_source, None
+            self._arm(self.source)
+        take = Take(self.seq, self.config.get("buffer_seconds", 30), self.config.get("buffer_spill_seconds", 300))
+        try: self.jobs.put_nowait(take)
+        except queue.Full:
+            log(f"ENGINE: {self.jobs.maxsize} takes already waiting to decode, not starting another.")
+            METRICS.inc("takes_refused_total")
+            return
+        with self.deliver_lock: self.pending[take.seq] = take
+        self.seq += 1
+        self.take, self.stats, self.rec = take, take.stats, True
+        self.ui.meter = LevelMeter(take.audio)
+        self.ui.queue.put(("show", None))
+        self.ui.queue.put(("color", "#EA6363"))
+        threading.Thread(target=self._run_rec, args=(take,), daemon=True).start()
+
+    def stop(self):
+        if not self.rec: return
+        self.rec = False
+        stats = self.take.stats
+        stats["t_stop"] = time.perf_counter()
+        METRICS.add_span("capture", stats["t_start"], stats["t_stop"])
+        self.ui.queue.put(("color", "#1DB954")) # Green
+
+    def cancel(self):
+        # Drops the take being recorded and every take not delivered yet
+        with self.deliver_lock: takes = list(self.pending.values())
+        for take in takes: take.cancelled.set()
+        if self.rec: self.stop()
+        if takes:
+            log(f"ENGINE: Cancelled {len(takes)} take(s).")
+            METRICS.inc("takes_cancelled_total", len(takes))
+
+    def _run_rec(self, take):
+        audio, stats = take.audio, take.stats
+        archive = self.archive # queues blocks for its writer thread, never waits on the encoder
+        if archive: stats["archive_id"] = archive.begin()
+        try:
+            self.source.start()
+            stats["preroll"] = getattr(self.source, "preroll_samples", 0) / RATE
+            METRICS.observe("preroll_seconds", stats["preroll"])
+            streaming = self.config.get("streaming", True)
+            min_chunk = int(self.config.get("stream_chunk_seconds", 5) * RATE)
+            max_chunk = MAX_CHUNK_SECONDS * RATE
+            hang = int(self.config.get("stream_silence_ms", 400) * RATE / 1000)
+            overlap = int(self.config.get("stream_overlap_seconds", 1.0) * RATE) if streaming else 0
+            limit = int(self.config.get("max_record_seconds", 0) * RATE)
+            cut = 0
+            while self.rec and self.take is take and not take.cancelled.is_set():
+                data = self.source.read()
+                if data is None: self.stop(); break # replay ran out
+                if not data: continue
+                t = time.perf_counter()
+                # Decoded audio (minus the overlap) is no longer needed in RAM
+                if streaming: audio.release(take.progress - overlap)
+                audio.append(data)
+                if archive: archive.write(stats["archive_id"], data)
+                stats["buffering"] += time.perf_counter() - t
+                if limit and len(audio) >= limit: self.stop(); break
+                if not streaming: continue
+                # Energy is only looked at once a cut is allowed, over the last `hang` samples
+                n = len(audio) - cut
+                if n >= max_chunk or (n >= min_chunk and mean_level(audio.view(len(audio) - hang)) < SILENCE_LEVEL):
+                    take.chunks.put(Chunk(audio.view(cut - overlap), len(audio)))
+                    METRICS.inc("stream_chunks_total")
+                    cut = len(audio)
+            self.source.stop()
+            # Only the tail after the last cut is still undecoded (all of it without streaming)
+            if len(audio) > cut and not take.cancelled.is_set():
+                take.chunks.put(Chunk(audio.view(cut - overlap), len(audio)))
+                if streaming: METRICS.inc("stream_chunks_total")
+        except Exception as e:
+            log(f"REC ERROR: {e}")
+        finally:
+            take.chunks.put(None)
+            if archive: archive.end(stats["archive_id"])
+            stats.setdefault("t_stop", time.perf_counter())
+            # Hide right away to return focus, unless the next take already started
+            if not self.rec: self.ui.queue.put(("hide", None))
+
+    def _decode_worker(self):
+        while True:
+            take = self.jobs.get()
+            try: self._decode(take)
+            except Exception as e:
+                log(f"PROC ERROR: {e}")
+                METRICS.inc("errors_total")
+            self._deliver(take)
+
+    def _decode(self, take):
+        # Chunks of one take decode in order, each prompted with the text so far.
+        # Capture keeps running while this decodes, so windows pipeline instead of stalling.
+        # With live_typing, idle gaps re-decode the still-open window and type the
+        # words two successive hypotheses agree on; the chunk's final decode
+        # then types whatever of it is left.
+        stats = take.stats
+        stats["queue_wait"] = time.perf_counter() - stats["t_start"] # waiting for a free decode worker
+        interval = self.config.get("live_interval_seconds", 1.0)
+        # Typing is only safe for the oldest undelivered take, or words would
+        # land before an earlier take's paste; later takes are pasted as usual
+        if self.config.get("live_typing") and self.config.get("streaming", True) and take.seq == self.next_seq:
+            take.live = {"typed": [], "hyp": [], "any": False}
+        live = take.live
+        while True:
+            try: chunk = take.chunks.get(timeout=interval if live else None)
+            except queue.Empty:
+                if self.rec and self.take is take: self._live_partial(take)
+                continue
+            if chunk is None: break
+            if take.cancelled.is_set(): continue
+            try:
+                audio = self._trim(chunk.audio, stats)
+                if audio is None:
+                    take.progress = chunk.end
+                    continue
+                context = " ".join(take.parts)[-PROMPT_CHARS:]
+                text = self._transcribe(audio, prompt=context, stats=stats, tier=self._take_tier(take))
+                if take.parts: text = merge_overlap(context, text)
+                if live:
+                    self._emit_live(live, text.split()[len(live["typed"]):])
+                    live["typed"], live["hyp"] = [], []
+                if text: take.parts.append(text)
+                log(f"STREAM: Chunk {audio.size / RATE:.1f}s -> '{text}'")
+            except Exception as e:
+                log(f"STREAM ERROR: {e}")
+            take.progress = chunk.end
+        take.text = " ".join(take.parts).strip()
+
+    def _trim(self, audio, stats=None):
+        # Energy pre-stage: silence never reaches the model, and a chunk with
+        # no speech at all (an accidental tap) is skipped without a decode
+        level = self.config.get("trim_level", 200)
+        if not level: return audio
+        t = time.perf_counter()
+        bounds = speech_bounds(audio, level, hangover_ms=self.config.get("trim_hangover_ms", 300))
+        kept = audio[bounds[0]:bounds[1]] if bounds else None
+        if stats is None: return kept # live partial: not counted as savings
+        saved = (audio.size - (kept.size if bounds else 0)) / RATE
+        stats["trimmed"] = stats.get("trimmed", 0.0) + saved
+        METRICS.add_span("trim", t, time.perf_counter(), saved=saved)
+        METRICS.inc("trimmed_seconds_total", saved)
+        if kept is None:
+            METRICS.inc("silent_chunks_total")
+            log(f"TRIM: Skipped {audio.size / RATE:.1f}s of silence.")
+        return kept
+
+    def _live_partial(self, take):
+        overlap = int(self.config.get("stream_overlap_seconds", 1.0) * RATE)
+        audio = take.audio.view(take.progress - overlap)
+        if audio.size < RATE: return
+        audio = self._trim(audio)
+        if audio is None: return
+        try:
+            context = " ".join(take.parts)[-PROMPT_CHARS:]
+            text = self._transcribe(audio, prompt=context, stats={}, escalate=False, cache=False, tier=self._take_tier(take))
+            if take.parts: text = merge_overlap(context, text)
+        except Exception as e:
+            log(f"LIVE ERROR: {e}")
+            return
+        live = take.live
+        words = text.split()
+        n = agreed_prefix(live["hyp"], words)
+        if n > len(live["typed"]):
+            self._emit_live(live, words[len(live["typed"]):n])
+            live["typed"] = words[:n]
+        live["hyp"] = words
+        METRICS.inc("live_partials_total")
+
+    def _emit_live(self, live, words):
+        if not words: return
+        t = time.perf_counter()
+        self.type_live((" " if live["any"] else "") + " ".join(words))
+        live["any"] = True
+        METRICS.add_span("live_output", t, time.perf_counter(), words=len(words))
+
+    def _take_tier(self, take):
+        # Tiering: short takes start on the fast model, long ones on the next tier.
+        # Decided once from the take's length, not per streamed chunk (those are cut
+        # at pauses long before tier_short_seconds), so a take never mixes models.
+        # While it is still being captured, that means waiting until it is either
+        # past the threshold or has ended; the user is still talking meanwhile.
+        if take.tier is None:
+            short = int(self.config.get("tier_short_seconds", 8) * RATE)
+            while "t_stop" not in take.stats and len(take.audio) <= short and not take.cancelled.is_set():
+                time.sleep(0.05)
+            take.tier = 0 if len(take.audio) <= short else 1
+        return take.tier
+
+    def _transcribe(self, audio, prompt=None, stats=None, escalate=True, cache=True, tier=0):
+        # Only unprompted clips (whole takes, a stream's first chunk) can batch: every
+        # later chunk carries its own prompt and so could never share a pass
+        batcher = None if prompt else self.batcher
+        if not batcher: return self._transcribe_tiers(audio, prompt, stats, escalate, cache, None, tier)
+        with self.batch_lock: self.batching += 1
+        try: return self._transcribe_tiers(audio, prompt, stats, escalate, cache, batcher, tier)
+        finally:
+            with self.batch_lock: self.batching -= 1
+
+    def _transcribe_tiers(self, audio, prompt, stats, escalate, cache, batcher, tier):
+        # float32 16 kHz mono goes straight to faster-whisper, no container decode
+        stats = self.stats if stats is None else stats
+        if not self.model: # first load, or the reload wake() started at key down
+            t = time.perf_counter()
+            while not self.model:
+                # idle again means the load failed; fail the take instead of waiting for the next key press
+                if self.idle: raise RuntimeError("no model loaded, the next key press retries")
+                time.sleep(0.02)
+            stats["model_wait"] = stats.get("model_wait", 0.0) + time.perf_counter() - t
+            METRICS.add_span("model_wait", t, time.perf_counter())
+        with self.swap_lock: # one consistent decoder for this call, even if a reload lands mid-take
+            profile, tiers, pool, first = self.profile, self.tiers, self.pool, self.model
+            options = {**self.options, "initial_prompt": prompt or None}
+        cache = self.cache if cache else None # live partials are never repeated, keep them out
+        digest = audio_digest(audio) if cache else None
+        # The take's tier (see _take_tier); a low-confidence chunk is retried one tier up
+        tier = min(tier, len(tiers) - 1)
+        while True:
+            key = cache and TranscriptCache.key(digest, tiers[tier], profile["compute_type"], **options)
+            hit = cache.get(key) if cache else None
+            if hit:
+                text, logprob, found = hit["text"], hit["logprob"], hit["segments"]
+            else:
+                model = first if tier == 0 else pool.get(tiers[tier])
+                def decode():
+                    # transcribe() runs VAD + features up front; segments are beam-searched lazily
+                    t = time.perf_counter()
+                    if batcher: # decoded eagerly together with other workers' clips, no separate VAD pass
+                        segments, _ = batcher.transcribe(model, audio, **options)
+                        t1 = t
+                    else:
+                        segments, _ = model.transcribe(audio, **options)
+                        t1 = time.perf_counter()
+                    return t, t1, list(segments)
+                # The batcher already bounds how many clips run at once
+                seconds = audio.size / RATE
+                stats["sched"] = plan = self.sched.plan()
+                t, t1, segments = decode() if batcher else self.sched.run(plan, seconds, decode)
+                t2 = time.perf_counter()
+                stats["vad"] = stats.get("vad", 0.0) + t1 - t
+                stats["beam_search"] = stats.get("beam_search", 0.0) + t2 - t1
+                METRICS.add_span("vad", t, t1)
+                METRICS.add_span("beam_search", t1, t2, model=tiers[tier], seconds=audio.size / RATE)
+                text = " ".join([s.text for s in segments]).strip()
+                logprob = sum(s.avg_logprob for s in segments) / len(segments) if segments else 0.0
+                found = len(segments)
+                if cache: cache.put(key, {"text": text, "logprob": logprob, "segments": found})
+            if escalate and tier + 1 < len(tiers) and found and logprob < self.config.get("tier_min_logprob", -0.8):
+                log(f"TIER: '{tiers[tier]}' avg_logprob {logprob:.2f}, retrying on '{tiers[tier + 1]}'")
+                METRICS.inc("tier_escalations_total")
+                tier += 1
+                continue
+            stats["model"] = tiers[tier]
+            return text
+
+    def _deliver(self, take):
+        # In take order: a take that finishes early waits for the ones before it.
+        # One thread outputs at a time, outside deliver_lock, so a slow paste
+        # never holds up start() on the key thread.
+        with self.deliver_lock:
+            self.finished[take.seq] = take
+            if self.delivering: return # the delivering thread picks it up
+            self.delivering = True
+        while True:
+            with self.deliver_lock:
+                done = self.finished.pop(self.next_seq, None)
+                if done is None:
+                    self.delivering = False
+                    return
+                self.pending.pop(done.seq, None)
+            self._output(done)
+            with self.deliver_lock:
+                self.last_used = time.monotonic()
+                self.next_seq += 1 # only now may the next take type live (see _decode)
+
+    def _output(self, take):
+        log("TRANS: Start")
+        stats, text = take.stats, take.text
+        try:
+            if take.cancelled.is_set():
+                log("TRANS: Cancelled.")
+                stats["cancelled"] = True
+                text = ""
+            else:
+                log(f"TRANS: Result: '{text}'")
+            t = time.perf_counter()
+            stats["decode"] = t - stats.get("t_stop", t) # release -> text, incl. waiting on the stream tail
+            if take.cancelled.is_set(): pass
+            elif take.live is not None:
+                log("TRANS: Already typed live.")
+            elif text and len(text) > 1:
+                self.paste(text)
+            else:
+                log("TRANS: No text found.")
+            done = time.perf_counter()
+            stats["output"] = done - t
+            stats["latency"] = done - stats.get("t_stop", done)
+            stats["audio_seconds"] = len(take.audio) / RATE
+            stats["text"] = text
+            METRICS.add_span("output", t, done, sink=getattr(self.paste, "name", "custom"))
+            METRICS.add_span("decode", stats.get("t_stop", t), t)
+            METRICS.observe("latency_seconds", stats["latency"])
+            METRICS.observe("buffering_seconds", stats["buffering"])
+            METRICS.inc("takes_total")
+            METRICS.inc("audio_seconds_total", stats["audio_seconds"])
+            if not text: METRICS.inc("empty_takes_total")
+            if self.history and not take.cancelled.is_set(): self.history.add(stats, self.profile["name"])
+        except Exception as e:
+            log(f"PROC ERROR: {e}")
+            METRICS.inc("errors_total")
+        if self.on_done: self.on_done(stats)
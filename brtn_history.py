@@ -0,0 +1,215 @@
+import os
+import re
+import sys
+import json
+import time
+import queue
+import sqlite3
+import argparse
+import threading
+from brtn_metrics import log
+
+# TRANSCRIPT HISTORY
+# Every delivered take is appended to one SQLite file: when, how long, which
+# model, the per-stage latencies and the text, with an FTS5 index over the text
+# (plain LIKE if this SQLite lacks FTS5). Rows are never updated. Rotation drops
+# whole days past max_days or the oldest rows past max_mb, and compaction merges
+# the index and hands freed pages back to the filesystem. Inserts happen on a
+# writer thread, so output never waits on the disk.
+#
+#   ./brtn.sh history search "quarterly report" --since 7d
+#   ./brtn.sh history recent -n 20
+HISTORY_PATH = "~/.brtn_history.sqlite"
+STAGE_COLUMNS = ("latency", "decode", "output", "buffering", "queue_wait", "vad", "beam_search", "trimmed", "model_wait")
+ROTATE_EVERY = 200 # inserts between rotations
+
+class TranscriptHistory:
+    def __init__(self, path=HISTORY_PATH, max_days=365, max_mb=50):
+        self.path = os.path.expanduser(path)
+        self.max_days = max_days
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, timeout=10, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA auto_vacuum=INCREMENTAL") # only takes effect on a new file
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        stages = "".join(f", {c} REAL" for c in STAGE_COLUMNS)
+        self.db.execute("CREATE TABLE IF NOT EXISTS takes (id INTEGER PRIMARY KEY, time REAL NOT NULL, "
+                        f"audio_seconds REAL, model TEXT, profile TEXT{stages}, text TEXT NOT NULL, archive_id TEXT)")
+        if "archive_id" not in [r[1] for r in self.db.execute("PRAGMA table_info(takes)")]: # older files
+            self.db.execute("ALTER TABLE takes ADD COLUMN archive_id TEXT")
+        self.db.execute("CREATE INDEX IF NOT EXISTS takes_time ON takes (time)")
+        try:
+            self.db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS takes_fts USING fts5(text, content='takes', content_rowid='id')")
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
+        self.q = queue.SimpleQueue()
+        self.added = 0
+        self.thread = None
+
+    def add(self, stats, profile=None):
+        # From Engine._output; the insert runs on the writer thread
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+        t = time.time() - (time.perf_counter() - stats.get("t_start", time.perf_counter())) # wall clock at key down
+        row = [t, stats.get("audio_seconds"), stats.get("model"), profile] + [stats.get(c) for c in STAGE_COLUMNS]
+        self.q.put(row + [stats.get("text", ""), stats.get("archive_id")])
+
+    def _run(self):
+        while True:
+            rows = [self.q.get()]
+            while True:
+                try: rows.append(self.q.get_nowait())
+                except queue.Empty: break
+            try:
+                for row in rows: self.insert(row)
+                if self.added >= ROTATE_EVERY: self.rotate()
+            except sqlite3.Error as e:
+                log(f"HISTORY: Write failed ({e})")
+
+    def insert(self, row):
+        cols = ("time", "audio_seconds", "model", "profile") + STAGE_COLUMNS + ("text", "archive_id")
+        with self.lock, self.db: # row + index entry in one transaction, rolled back together
+            self.db.execute("BEGIN")
+            cur = self.db.execute(f"INSERT INTO takes ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})", row)
+            if self.fts: self.db.execute("INSERT INTO takes_fts (rowid, text) VALUES (?, ?)", (cur.lastrowid, row[-2]))
+            self.added += 1
+
+    def _delete(self, where, args=()):
+        # External-content FTS needs the old text to remove a row from the index
+        if self.fts:
+            self.db.execute("INSERT INTO takes_fts (takes_fts, rowid, text) "
+                            f"SELECT 'delete', id, text FROM takes WHERE {where}", args)
+        return self.db.execute(f"DELETE FROM takes WHERE {where}", args).rowcount
+
+    def size(self):
+        pages, free, page = (self.db.execute(f"PRAGMA {p}").fetchone()[0] for p in ("page_count", "freelist_count", "page_size"))
+        return (pages - free) * page
+
+    def rotate(self):
+        with self.lock, self.db:
+            self.added = 0
+            self.db.execute("BEGIN")
+            dropped = self._delete("time < ?", (time.time() - self.max_days * 86400,)) if self.max_days else 0
+            size = self.size()
+            if self.max_bytes and size > self.max_bytes:
+                # Oldest rows, sized by the average row so one pass lands at ~90% of the cap
+                n = self.db.execute("SELECT COUNT(*) FROM takes").fetchone()[0]
+                excess = n - int(n * self.max_bytes * 0.9 / size)
+                dropped += self._delete("id IN (SELECT id FROM takes ORDER BY id LIMIT ?)", (excess,))
+        if dropped:
+            log(f"HISTORY: Rotated out {dropped} take(s).")
+            self.compact()
+        return dropped
+
+    def compact(self, full=False):
+        # full rewrites the whole file (slow, CLI only); it also switches files
+        # created before auto_vacuum to incremental, so later compactions work
+        with self.lock:
+            if self.fts: self.db.execute("INSERT INTO takes_fts (takes_fts) VALUES ('optimize')")
+            if full: self.db.execute("VACUUM")
+            elif self.db.execute("PRAGMA auto_vacuum").fetchone()[0] == 2: # INCREMENTAL
+                # Each step of the statement frees one page, so run it to completion
+                while self.db.execute("PRAGMA freelist_count").fetchone()[0]:
+                    self.db.execute("PRAGMA incremental_vacuum").fetchall()
+            self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def search(self, query=None, since=None, until=None, limit=20):
+        # Newest first; query is FTS5 syntax ("exact phrase", prefix*, a OR b)
+        where, args = [], []
+        if query and self.fts:
+            where.append("id IN (SELECT rowid FROM takes_fts WHERE takes_fts MATCH ?)")
+            args.append(query)
+        elif query:
+            where.append("text LIKE ?")
+            args.append(f"%{query}%")
+        if since is not None: where.append("time >= ?"); args.append(since)
+        if until is not None: where.append("time < ?"); args.append(until)
+        sql = "SELECT * FROM takes" + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY time DESC LIMIT ?"
+        with self.lock:
+            cur = self.db.execute(sql, args + [limit])
+            names = [d[0] for d in cur.description]
+            return [dict(zip(names, r)) for r in cur.fetchall()]
+
+    def stats(self, since=None, until=None):
+        # Per-stage p50/p95 over a time range: the production performance record
+        rows = self.search(since=since, until=until, limit=-1)
+        out = {"takes": len(rows), "audio_seconds": sum(r["audio_seconds"] or 0 for r in rows)}
+        for c in STAGE_COLUMNS:
+            v = sorted(r[c] for r in rows if r[c] is not None)
+            if v: out[c] = {"p50": v[len(v) // 2], "p95": v[min(len(v) - 1, int(len(v) * 0.95))]}
+        return out
+
+    def close(self):
+        with self.lock: self.db.close()
+
+def open_history(config):
+    # None when disabled or the file can't be opened
+    if not config.get("history", True): return None
+    try:
+        return TranscriptHistory(config.get("history_path") or HISTORY_PATH, config.get("history_max_days", 365),
+                                 config.get("history_max_mb", 50))
+    except sqlite3.Error as e:
+        log(f"HISTORY: Disabled ({e})")
+        return None
+
+def parse_time(s):
+    # "7d" / "12h" / "30m" ago, or an ISO date / datetime in local time
+    m = re.fullmatch(r"(\d+(?:\.\d+)?)([dhm])", s)
+    if m: return time.time() - float(m.group(1)) * {"d": 86400, "h": 3600, "m": 60}[m.group(2)]
+    for fmt in ("%Y-%m-%d", "%Y-%m-%dT%H:%M", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S"):
+        try: return time.mktime(time.strptime(s, fmt))
+        except ValueError: pass
+    raise argparse.ArgumentTypeError(f"not a time: {s!r} (use 7d, 12h, 2024-05-01 or 2024-05-01T09:30)")
+
+def main(argv=None):
+    from brtn_config import load_config
+    ap = argparse.ArgumentParser(prog="brtn history", description="Search past dictations")
+    ap.add_argument("--path", default=None, help="history file (default: history_path from the config)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name, help in (("search", "full-text search, newest first"), ("recent", "latest takes"),
+                       ("stats", "per-stage latency over a time range")):
+        p = sub.add_parser(name, help=help)
+        if name == "search": p.add_argument("query", help='FTS5 query: words, "a phrase", prefix*, a OR b')
+        p.add_argument("--since", type=parse_time, default=None)
+        p.add_argument("--until", type=parse_time, default=None)
+        if name != "stats": p.add_argument("-n", "--limit", type=int, default=20)
+        p.add_argument("--json", action="store_true")
+    sub.add_parser("compact", help="rotate by age/size and rewrite the file compactly")
+    args = ap.parse_args(argv)
+
+    config = load_config()
+    path = os.path.expanduser(args.path or config.get("history_path") or HISTORY_PATH)
+    if not os.path.exists(path): ap.error(f"no history at {path}")
+    history = TranscriptHistory(path, config.get("history_max_days", 365), config.get("history_max_mb", 50))
+    if args.cmd == "compact":
+        before = os.path.getsize(path)
+        dropped = history.rotate()
+        history.compact(full=True)
+        print(f"{dropped} take(s) rotated out, {before / 1024:.0f} KB -> {os.path.getsize(path) / 1024:.0f} KB")
+        return 0
+    if args.cmd == "stats":
+        out = history.stats(args.since, args.until)
+        if args.json: print(json.dumps(out, indent=2))
+        else:
+            print(f"{out['takes']} take(s), {out['audio_seconds']:.0f}s audio")
+            for c in STAGE_COLUMNS:
+                if c not in out: continue
+                if c == "trimmed": # seconds of audio cut, not time spent
+                    print(f"  {c:12} p50 {out[c]['p50']:7.1f} s    p95 {out[c]['p95']:7.1f} s")
+                else: print(f"  {c:12} p50 {out[c]['p50'] * 1000:7.0f} ms   p95 {out[c]['p95'] * 1000:7.0f} ms")
+        return 0
+    try: rows = history.search(getattr(args, "query", None), args.since, args.until, args.limit)
+    except sqlite3.OperationalError as e: ap.error(f"bad query: {e}")
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return 0
+    for r in reversed(rows):
+        when = time.strftime("%Y-%m-%d %H:%M", time.localtime(r["time"]))
+        print(f"{when}  {r['audio_seconds'] or 0:5.1f}s  {r['model'] or '?':>8}  {r['text']}" + (f"  [archive:{r['archive_id']}]" if r.get("archive_id") else ""))
+    return 0 if rows else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+import time
+import threading
+
+# HOTKEY INPUT
+# Key sources block until a key goes down or up and call dispatch(code, down, t).
+# TriggerMachine turns those edges into start/stop according to the configured
+# triggers, so nothing has to wake up while the user is idle. Sources read
+# self.codes on every event, so assigning a new set retargets them live.
+DOUBLE_TAP_WINDOW = 0.4
+
+def key_code(code):
+    # Settings may store the raw Tk keycode; the virtual key lives in the low or top byte
+    return (code >> 24) & 0xFF if code > 65535 else code & 0xFF
+
+class TriggerMachine:
+    def __init__(self, on_start, on_stop, start_trigger="hold", start_key=63,
+                 end_trigger="release", end_key=63, is_active=None, window=DOUBLE_TAP_WINDOW,
+                 on_cancel=None, cancel_key=0, on_press=None):
+        self.on_start = on_start
+        self.on_press = on_press # any press of the start key, before the trigger decides
+        self.on_stop = on_stop
+        self.on_cancel = on_cancel
+        self.cancel_key = key_code(cancel_key) if cancel_key else None
+        self.is_active = is_active
+        self.window = window
+        self.recording = False
+        self.set_triggers(start_trigger, start_key, end_trigger, end_key)
+
+    def set_triggers(self, start_trigger, start_key, end_trigger, end_key):
+        # The settings UI writes "double tap"; older configs use "double_tap"
+        start_trigger = start_trigger.replace(" ", "_")
+        end_trigger = "release" if start_trigger == "hold" else end_trigger.replace(" ", "_")
+        # "release" only means something for hold; otherwise the start gesture toggles (tap stops on the next press)
+        if start_trigger != "hold" and end_trigger == "release": end_trigger = start_trigger
+        start_key = key_code(start_key)
+        self.end_key = start_key if end_trigger == "release" else key_code(end_key)
+        self.start_key, self.start_trigger, self.end_trigger = start_key, start_trigger, end_trigger
+        self.last_down = {}
+
+    @classmethod
+    def from_config(cls, config, on_start, on_stop, is_active=None, on_cancel=None, on_press=None):
+        return cls(on_start, on_stop, config.get("start_trigger", "hold"), config.get("start_key_code", 63),
+                   config.get("end_trigger", "release"), config.get("end_key_code", 63), is_active,
+                   on_cancel=on_cancel, cancel_key=config.get("cancel_key_code", 0), on_press=on_press)
+
+    def reconfigure(self, config):
+        # Hot reload: takes effect on the next key event, an ongoing take is left alone
+        self.set_triggers(config.get("start_trigger", "hold"), config.get("start_key_code", 63),
+                          config.get("end_trigger", "release"), config.get("end_key_code", 63))
+        cancel = config.get("cancel_key_code", 0)
+        self.cancel_key = key_code(cancel) if cancel else None
+
+    def _fires(self, trigger, down, t, prev):
+        if trigger == "release": return not down
+        if not down: return False
+        if trigger in ("hold", "tap"): return True
+        if trigger == "double_tap": return prev is not None and t - prev < self.window
+        return False
+
+    def feed(self, code, down, t=None):
+        t = time.time() if t is None else t
+        code = key_code(code)
+        if code == self.cancel_key and code not in (self.start_key, self.end_key):
+            if down and self.on_cancel:
+                self.recording = False
+                self.on_cancel()
+            return
+        prev = None
+        if down and code == self.start_key and self.on_press: self.on_press()
+        if down:
+            prev = self.last_down.get(code)
+            self.last_down[code] = t
+        if self.is_active: self.recording = self.is_active() # engine may have stopped on its own
+        if not self.recording:
+            if code == self.start_key and self._fires(self.start_trigger, down, t, prev):
+                self.recording = True
+                self.last_down.pop(code, None) # the firing press can't count toward the next double-tap
+                self.on_start()
+        elif code == self.end_key and self._fires(self.end_trigger, down, t, prev):
+            self.recording = False
+            self.last_down.pop(code, None)
+            self.on_stop()
+
+# macOS: a listen-only CGEventTap on its own CFRunLoop. Modifier keys such as
+# Fn arrive as FlagsChanged, so their state is read back once per event.
+class QuartzKeySource:
+    def __init__(self, codes):
+        self.codes = {key_code(c) for c in codes}
+        self.down = set()
+        self.loop = None
+        self.tap = None
+
+    def run(self, dispatch):
+        import Quartz
+        def callback(proxy, etype, event, refcon):
+            if etype in (Quartz.kCGEventTapDisabledByTimeout, Quartz.kCGEventTapDisabledByUserInput):
+                Quartz.CGEventTapEnable(self.tap, True)
+                return event
+            code = Quartz.CGEventGetIntegerValueField(event, Quartz.kCGKeyboardEventKeycode)
+            if code not in self.codes: return event
+            if etype == Quartz.kCGEventFlagsChanged:
+                down = bool(Quartz.CGEventSourceKeyState(Quartz.kCGEventSourceStateCombinedSessionState, code))
+            else:
+                down = etype == Quartz.kCGEventKeyDown
+            if down != (code in self.down): # drops auto-repeat
+                (self.down.add if down else self.down.discard)(code)
+                dispatch(code, down, time.time())
+            return event
+
+        mask = (Quartz.CGEventMaskBit(Quartz.kCGEventKeyDown) | Quartz.CGEventMaskBit(Quartz.kCGEventKeyUp) |
+                Quartz.CGEventMaskBit(Quartz.kCGEventFlagsChanged))
+        self.tap = Quartz.CGEventTapCreate(Quartz.kCGSessionEventTap, Quartz.kCGHeadInsertEventTap,
+                                           Quartz.kCGEventTapOptionListenOnly, mask, callback, None)
+        if not self.tap: raise RuntimeError("event tap unavailable (Accessibility / Input Monitoring?)")
+        source = Quartz.CFMachPortCreateRunLoopSource(None, self.tap, 0)
+        self.loop = Quartz.CFRunLoopGetCurrent()
+        Quartz.CFRunLoopAddSource(self.loop, source, Quartz.kCFRunLoopCommonModes)
+        Quartz.CGEventTapEnable(self.tap, True)
+        Quartz.CFRunLoopRun()
+
+    def stop(self):
+        if self.loop:
+            import Quartz
+            Quartz.CFRunLoopStop(self.loop)
+
+# Fallback when no event tap can be created: the old 10 ms state poll, turned into edges
+class PollingKeySource:
+    def __init__(self, codes, is_pressed, interval=0.01):
+        self.codes = {key_code(c) for c in codes}
+        self.is_pressed = is_pressed
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self, dispatch):
+        last = {}
+        while not self.stopped.wait(self.interval):
+            for c in self.codes:
+                p = bool(self.is_pressed(c))
+                if p != last.get(c, False):
+                    last[c] = p
+                    dispatch(c, p, time.time())
+
+    def stop(self):
+        self.stopped.set()
+
+# Replays (seconds, code, down) events for tests and benchmarks on any platform
+class ScriptedKeySource:
+    def __init__(self, events, speed=1.0):
+        self.events = sorted(events, key=lambda e: e[0])
+        self.speed = speed
+        self.stopped = threading.Event()
+
+    def run(self, dispatch):
+        t0 = time.time()
+        for at, code, down in self.events:
+            if self.stopped.wait(max(0.0, t0 + at / self.speed - time.time())): return
+            dispatch(code, down, t0 + at / self.speed)
+
+    def stop(self):
+        self.stopped.set()
@@ -5,6 +5,12 @@ import os
 def main():
     if len(sys.argv) > 1 and sys.argv[1] == "--settings":
         subprocess.Popen([sys.executable, "brtn_settings_ui.py"])
+    elif len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        # Shared model process; transcribers with "use_worker" connect to it
+        subprocess.Popen([sys.executable, "brtn_worker.py"] + sys.argv[2:], start_new_session=True)
+    elif len(sys.argv) > 1 and sys.argv[1] == "transcribe":
+        # Headless batch mode runs in the foreground: brtn_launcher.py transcribe <paths...>
+        sys.exit(subprocess.call([sys.executable, "brtn_batch.py"] + sys.argv[2:]))
     else:
         # Start the transcriber
         # In a real app we might want to start it in a detached way
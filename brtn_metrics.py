@@ -0,0 +1,165 @@
+import os
+import time
+import json
+import queue
+import atexit
+import bisect
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# OBSERVABILITY
+# log() hands lines to a background writer (the file is opened once, writes are
+# batched), and METRICS keeps counters, gauges, per-stage histograms and a bounded ring
+# of trace spans. Both are cheap enough for the capture/decode hot path.
+# Next to the code, as when brtn.sh runs from there, not in whatever directory a CLI was called from
+LOG_PATH = os.environ.get("BRTN_LOG") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "transcriber_debug.txt")
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class LogWriter:
+    def __init__(self, path):
+        self.path = path
+        self.q = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def write(self, line):
+        self.q.put(line)
+
+    def _run(self):
+        with open(self.path, "a") as f:
+            while True:
+                line = self.q.get()
+                batch = []
+                while line is not None:
+                    batch.append(line)
+                    try: line = self.q.get_nowait()
+                    except queue.Empty: break
+                f.write("".join(batch)); f.flush()
+                if line is None: return
+
+    def close(self):
+        self.q.put(None)
+        self.thread.join(2)
+
+_writer = None
+_writer_lock = threading.Lock()
+
+# LOGGING
+def log(msg):
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = LogWriter(LOG_PATH)
+                atexit.register(_writer.close)
+    _writer.write(f"{time.strftime('%H:%M:%S')} - {msg}\n")
+
+class Histogram:
+    def __init__(self, recent=1024):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=recent) # for p50/p95 in the JSON view
+
+    def observe(self, v):
+        self.counts[bisect.bisect_left(BUCKETS, v)] += 1
+        self.sum += v
+        self.count += 1
+        self.recent.append(v)
+
+    def quantile(self, q):
+        if not self.recent: return None
+        vals = sorted(self.recent)
+        return vals[min(len(vals) - 1, int(q * len(vals)))]
+
+class Metrics:
+    def __init__(self, max_spans=20000):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.hists = {}
+        self.spans = deque(maxlen=max_spans)
+        self.t0 = time.perf_counter()
+
+    def inc(self, name, n=1):
+        with self.lock: self.counters[name] = self.counters.get(name, 0) + n
+
+    def set(self, name, v):
+        with self.lock: self.gauges[name] = v
+
+    def observe(self, name, seconds):
+        with self.lock:
+            h = self.hists.get(name)
+            if h is None: h = self.hists[name] = Histogram()
+            h.observe(seconds)
+
+    def add_span(self, name, start, end, **args):
+        # start/end are perf_counter() values; the span also feeds the <name>_seconds histogram
+        self.observe(f"{name}_seconds", end - start)
+        self.spans.append((name, start, end, threading.get_ident(), args))
+
+    @contextmanager
+    def span(self, name, **args):
+        t = time.perf_counter()
+        try: yield
+        finally: self.add_span(name, t, time.perf_counter(), **args)
+
+    def snapshot(self):
+        with self.lock:
+            return {"counters": dict(self.counters), "gauges": dict(self.gauges),
+                    "histograms": {k: {"count": h.count, "sum": h.sum, "p50": h.quantile(0.5), "p95": h.quantile(0.95)}
+                                   for k, h in self.hists.items()}}
+
+    def prometheus(self):
+        out = []
+        with self.lock:
+            for k, v in sorted(self.counters.items()):
+                out += [f"# TYPE brtn_{k} counter", f"brtn_{k} {v}"]
+            for k, v in sorted(self.gauges.items()):
+                out += [f"# TYPE brtn_{k} gauge", f"brtn_{k} {v}"]
+            for k, h in sorted(self.hists.items()):
+                out.append(f"# TYPE brtn_{k} histogram")
+                acc = 0
+                for le, c in zip(BUCKETS + ("+Inf",), h.counts):
+                    acc += c
+                    out.append(f'brtn_{k}_bucket{{le="{le}"}} {acc}')
+                out += [f"brtn_{k}_sum {h.sum}", f"brtn_{k}_count {h.count}"]
+        return "\n".join(out) + "\n"
+
+    def chrome_trace(self):
+        # chrome://tracing / Perfetto "complete" events, microseconds from process start
+        pid = os.getpid()
+        return {"traceEvents": [{"name": n, "ph": "X", "pid": pid, "tid": tid, "args": args,
+                                 "ts": (s - self.t0) * 1e6, "dur": (e - s) * 1e6}
+                                for n, s, e, tid, args in list(self.spans)]}
+
+    def dump_trace(self, path):
+        with open(path, "w") as f: json.dump(self.chrome_trace(), f)
+
+    def serve(self, port, host="127.0.0.1"):
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler # only when enabled
+        metrics = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, ctype = metrics.prometheus().encode(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, ctype = json.dumps(metrics.snapshot()).encode(), "application/json"
+                elif self.path == "/trace.json":
+                    body, ctype = json.dumps(metrics.chrome_trace()).encode(), "application/json"
+                else:
+                    self.send_error(404); return
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def log_message(self, *args): pass
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        log(f"METRICS: Serving on http://{host}:{port}/metrics")
+        return server
+
+METRICS = Metrics()
@@ -0,0 +1,124 @@
+import os
+import sys
+import time
+import threading
+from brtn_metrics import log
+
+# OUTPUT SINKS
+# A sink is a callable taking the final text. Engine times the call as its
+# "output" stage, so every sink shows up in the metrics and the benchmark.
+KVK_ANSI_V = 9
+RESTORE_DELAY = 0.5 # the target app reads the pasteboard asynchronously after Cmd+V
+
+def wait_ready(timeout):
+    # Replaces the old fixed 0.4s sleep: paste as soon as no modifier (incl. the
+    # Fn trigger) is held and the frontmost app isn't us, or after `timeout`.
+    import Quartz
+    mask = (Quartz.kCGEventFlagMaskCommand | Quartz.kCGEventFlagMaskShift | Quartz.kCGEventFlagMaskAlternate |
+            Quartz.kCGEventFlagMaskControl | Quartz.kCGEventFlagMaskSecondaryFn)
+    try:
+        from AppKit import NSWorkspace
+        frontmost = lambda: NSWorkspace.sharedWorkspace().frontmostApplication().processIdentifier()
+    except Exception:
+        frontmost = lambda: None
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        held = Quartz.CGEventSourceFlagsState(Quartz.kCGEventSourceStateCombinedSessionState) & mask
+        if not held and frontmost() != os.getpid(): return True
+        time.sleep(0.005)
+    log("OUTPUT: Not ready before timeout, delivering anyway.")
+    return False
+
+def post_keys(keycode, flags=0, text=None):
+    import Quartz
+    src = Quartz.CGEventSourceCreate(Quartz.kCGEventSourceStateHIDSystemState)
+    for down in (True, False):
+        ev = Quartz.CGEventCreateKeyboardEvent(src, keycode, down)
+        Quartz.CGEventSetFlags(ev, flags) # explicit, so a held Fn/trigger key doesn't leak in
+        if text: Quartz.CGEventKeyboardSetUnicodeString(ev, len(text.encode("utf-16-le")) // 2, text)
+        Quartz.CGEventPost(Quartz.kCGHIDEventTap, ev)
+
+# Clipboard + Cmd+V, posted as CGEvents in-process (no osascript fork). The
+# previous clipboard text is put back shortly after unless something replaced ours.
+class PasteSink:
+    name = "paste"
+
+    def __init__(self, restore=True, ready_timeout=0.3, method="cgevent"):
+        from pynput.keyboard import Controller
+        self.keyboard = Controller()
+        self.restore = restore
+        self.ready_timeout = ready_timeout
+        self.method = method
+
+    def __call__(self, text):
+        import pyperclip
+        from pynput.keyboard import Key
+        saved = None
+        if self.restore:
+            try: saved = pyperclip.paste()
+            except Exception: pass
+        # 1. Use Clipboard - much more reliable than direct typing for large bursts
+        pyperclip.copy(text)
+        wait_ready(self.ready_timeout)
+
+        # 2. MODIFIER FLUSH (Ensure Fn-key/Cmd aren't "hanging")
+        for k in [Key.cmd, Key.shift, Key.alt, Key.ctrl, Key.cmd_r]:
+            self.keyboard.release(k)
+
+        # 3. NATIVE PASTE
+        if self.method == "osascript": # layout-aware, but forks a process per paste
+            os.system('osascript -e "tell application \\"System Events\\" to keystroke \\"v\\" using command down"')
+        else:
+            import Quartz
+            post_keys(KVK_ANSI_V, Quartz.kCGEventFlagMaskCommand)
+
+        if saved is not None and saved != text:
+            threading.Timer(RESTORE_DELAY, self._restore, args=(text, saved)).start()
+
+    def _restore(self, ours, saved):
+        import pyperclip
+        try:
+            if pyperclip.paste() == ours: pyperclip.copy(saved)
+        except Exception as e:
+            log(f"OUTPUT: Clipboard restore failed: {e}")
+
+TYPE_BURST = 20 # characters per event, the most CGEventKeyboardSetUnicodeString reliably takes
+
+def type_text(text):
+    for i in range(0, len(text), TYPE_BURST):
+        post_keys(0, text=text[i:i + TYPE_BURST])
+
+# Types the text as synthesized Unicode key events; leaves the clipboard alone
+class TypeSink:
+    name = "type"
+
+    def __init__(self, ready_timeout=0.3):
+        self.ready_timeout = ready_timeout
+
+    def __call__(self, text):
+        wait_ready(self.ready_timeout)
+        type_text(text)
+
+# Headless sinks
+class FileSink:
+    name = "file"
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+
+    def __call__(self, text):
+        with open(self.path, "a") as f: f.write(text + "\n")
+
+class StdoutSink:
+    name = "stdout"
+
+    def __call__(self, text):
+        sys.stdout.write(text + "\n"); sys.stdout.flush()
+
+def make_sink(config):
+    kind = config.get("output_sink", "paste")
+    timeout = config.get("paste_ready_timeout_ms", 300) / 1000
+    if kind == "type": return TypeSink(timeout)
+    if kind == "file": return FileSink(config.get("output_file") or "~/brtn_transcripts.txt")
+    if kind == "stdout": return StdoutSink()
+    return PasteSink(config.get("clipboard_restore", True), timeout, config.get("paste_method", "cgevent"))
@@ -0,0 +1,100 @@
+import os
+import sys
+import time
+import heapq
+import threading
+import subprocess
+from functools import lru_cache
+
+# DECODE SCHEDULING
+# CTranslate2 fixes intra-op threads when a model loads, so what can change per
+# job is how many decodes run at once and in which order. Each decode asks
+# DecodeScheduler for a slot: the number of slots follows the cores that are
+# actually free (load average minus our own decodes) and drops to one on
+# battery, and shorter audio is admitted first. Priority is left to whole
+# processes: CTranslate2 computes on its own pool threads, so a per-thread QoS
+# on the calling thread would not reach them; batch runs nice themselves
+# instead (see brtn_batch). Stdlib only, so the front end can import it.
+POWER_TTL = 30 # seconds an on_battery() answer is reused
+
+@lru_cache(maxsize=None)
+def topology():
+    # {"logical": usable CPUs, "performance": the fast ones (Apple silicon P-cores, else all)}
+    try: logical = len(os.sched_getaffinity(0))
+    except AttributeError: logical = os.cpu_count() or 1
+    performance = logical
+    if sys.platform == "darwin":
+        out = subprocess.run(["sysctl", "-n", "hw.perflevel0.logicalcpu"], capture_output=True, text=True)
+        if out.stdout.strip().isdigit(): performance = min(logical, int(out.stdout))
+    return {"logical": logical, "performance": performance}
+
+_power = (0.0, False)
+
+def on_battery():
+    global _power
+    t, battery = _power
+    if time.monotonic() - t < POWER_TTL: return battery
+    battery = False
+    try:
+        if sys.platform == "darwin":
+            out = subprocess.run(["pmset", "-g", "batt"], capture_output=True, text=True)
+            battery = "Battery Power" in out.stdout
+        else:
+            supplies = "/sys/class/power_supply"
+            for name in os.listdir(supplies):
+                path = os.path.join(supplies, name)
+                try:
+                    with open(os.path.join(path, "type")) as f: kind = f.read().strip()
+                    with open(os.path.join(path, "online")) as f: online = f.read().strip() == "1"
+                except OSError: continue
+                if kind == "Mains": battery = not online; break
+    except OSError: pass
+    _power = (time.monotonic(), battery)
+    return battery
+
+def load_average():
+    try: return os.getloadavg()[0]
+    except OSError: return 0.0
+
+class DecodeScheduler:
+    def __init__(self, threads, workers=1):
+        self.threads = max(1, threads)
+        self.workers = max(1, workers)
+        self.cond = threading.Condition()
+        self.active = 0
+        self.waiting = [] # heap of (seconds, n) for jobs waiting on a slot
+        self.n = 0
+
+    def plan(self):
+        # The settings for one job; Engine keeps them in the take's stats for the benchmark
+        cores = topology()["logical"]
+        load = max(0.0, load_average() - self.active * self.threads) # others' load, not our own decodes
+        battery = on_battery()
+        slots = 1 if battery else max(1, min(self.workers, int((cores - load) // self.threads)))
+        return {"threads": self.threads, "slots": slots, "load": round(load, 2), "battery": battery}
+
+    def run(self, plan, seconds, fn):
+        # fn() once one of plan["slots"] is free; shorter jobs go first
+        with self.cond:
+            self.n += 1
+            me = (seconds, self.n)
+            heapq.heappush(self.waiting, me)
+            while self.active >= plan["slots"] or self.waiting[0] != me: self.cond.wait()
+            heapq.heappop(self.waiting)
+            self.active += 1
+            self.cond.notify_all()
+        try: return fn()
+        finally:
+            with self.cond:
+                self.active -= 1
+                self.cond.notify_all()
+
+def batch_plan(files, threads=0, jobs=0):
+    # Worker processes x threads for a batch run: P-cores for threads, as many
+    # processes as there are free cores (one on battery)
+    topo = topology()
+    free = max(1, int(topo["logical"] - load_average()))
+    threads = threads or max(1, min(4, topo["performance"]))
+    jobs = jobs or (1 if on_battery() else max(1, free // threads))
+    jobs = max(1, min(jobs, files))
+    return jobs, threads
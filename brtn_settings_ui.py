@@ -4,6 +4,7 @@ import json
 import os
 import sys
 import subprocess
+from brtn_config import DECODE_PROFILES, decode_profile
 
 # Colors
 COLOR_BG_MID = "#FFEDEB"
@@ -31,8 +32,10 @@ def load_config():
 
 def save_config(config):
     try:
-        with open(CONFIG_PATH, 'w') as f:
+        tmp = CONFIG_PATH + ".tmp"
+        with open(tmp, 'w') as f:
             json.dump(config, f, indent=4)
+        os.replace(tmp, CONFIG_PATH) # the running transcriber never sees half a file
     except: pass
 
 def draw_rounded_rect(canvas, x1, y1, x2, y2, r, **kwargs):
@@ -283,7 +286,7 @@ class BRTNSettingsApp:
         self.canvas.create_window(input_x, finish_y, window=self.ek_inp)
         
         consent_x = left_label_x
-        consent_y = 385
+        consent_y = 365
         self.show_icon_var = tk.BooleanVar(value=self.config.get("show_icon", True))
         self.cb_canvas = tk.Canvas(self.root, width=32, height=32, bg=COLOR_BG_MID, highlightthickness=0)
         self.draw_checkbox()
@@ -293,6 +296,16 @@ class BRTNSettingsApp:
         self.cb_canvas.bind("<Button-1>", self.toggle_icon_consent)
         self.canvas.tag_bind(cb_label, "<Button-1>", self.toggle_icon_consent)
         self.cb_canvas.config(cursor="pointinghand")
+
+        # Decode profile: speed vs. accuracy, details in brtn_config.DECODE_PROFILES
+        profile_y = 425
+        self.canvas.create_text(left_label_x, profile_y, text="Decode:", font=("Montserrat Medium", 17), fill=COLOR_TEXT, anchor="w")
+        self.profile_var = tk.StringVar(value=self.config.get("decode_profile", "balanced"))
+        self.profile_dd = CustomDropdown(self.root, list(DECODE_PROFILES), self.profile_var, self.on_profile_change)
+        self.canvas.create_window(left_label_x + 95, profile_y, window=self.profile_dd, anchor="w")
+        self.profile_info = self.canvas.create_text(left_label_x + 240, profile_y, text="", font=("Montserrat Medium", 13),
+                                                    fill=COLOR_TEXT, anchor="w")
+        self.on_profile_change()
         
         self.draw_save_btn()
         self.on_trigger_change()
@@ -310,8 +323,15 @@ class BRTNSettingsApp:
         self.show_icon_var.set(not self.show_icon_var.get())
         self.draw_checkbox()
 
+    def on_profile_change(self, val=None):
+        errors = []
+        p = decode_profile({**self.config, "decode_profile": self.profile_var.get()}, errors)
+        info = f"{p['model']} · {p['compute_type']} · beam {p['beam_size']} · {p['cpu_threads']} threads"
+        if errors: info += f"\n⚠ {errors[0]}"
+        self.canvas.itemconfig(self.profile_info, text=info, fill=COLOR_PRIMARY if errors else COLOR_TEXT)
+
     def draw_save_btn(self):
-        bx, by = self.w/2, 500
+        bx, by = self.w/2, 510
         bw, bh = 240, 70
         r = 35 
         
@@ -349,6 +369,8 @@ class BRTNSettingsApp:
 
     def save(self):
         conf = {
+            **self.config, # keep everything this window doesn't edit
+            "decode_profile": self.profile_var.get(),
             "start_trigger": self.st_var.get(), "end_trigger": self.et_var.get(),
             "start_key_code": int(self.sk_code.get()) & 0xFF,
             "start_key_name": self.sk_name.get(),
@@ -357,9 +379,9 @@ class BRTNSettingsApp:
             "show_icon": self.show_icon_var.get()
         }
         save_config(conf)
-        try: os.system("pkill -f brtn_transcriber.py")
-        except: pass
-        subprocess.Popen([sys.executable, "brtn_transcriber.py"], start_new_session=True)
+        # A running transcriber picks the file up by itself (brtn_config.ConfigWatcher)
+        if subprocess.call(["pgrep", "-f", "brtn_transcriber.py"], stdout=subprocess.DEVNULL) != 0:
+            subprocess.Popen([sys.executable, "brtn_transcriber.py"], start_new_session=True)
         self.safe_exit()
 
 if __name__ == "__main__":
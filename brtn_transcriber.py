@@ -1,28 +1,25 @@
+import time
+T_LAUNCH = time.perf_counter()
 import os
 import sys
-import json
-import time
-import wave
 import threading
 import queue
 import math
-import tempfile
-import numpy as np
-import pyaudio
-import pyperclip
-from pynput.keyboard import Controller, Key
+import atexit
 import tkinter as tk
-from faster_whisper import WhisperModel
-import Quartz
+from brtn_config import load_config, ConfigWatcher
+from brtn_metrics import METRICS, log
+from brtn_input import TriggerMachine, QuartzKeySource, PollingKeySource, key_code
 
-# LOGGING
-def log(msg):
-    with open("transcriber_debug.txt", "a") as f:
-        f.write(f"{time.strftime('%H:%M:%S')} - {msg}\n")
+# Fast start: this module only pulls in the stdlib, Tk and the small brtn_*
+# helpers. Quartz is imported by the key thread, and numpy / PortAudio /
+# CTranslate2 (via brtn_engine) on a background thread after the badge and
+# hotkey listener are up. Check with: python brtn_bench.py --import-budget 150
 
 # Check macOS Accessibility
 def check_accessibility():
     try:
+        import Quartz
         if not Quartz.AXIsProcessTrusted():
             log("WARNING: Accessibility not enabled.")
             return False
@@ -33,27 +30,93 @@ log("=== BRTN START - ZERO FOCUS MODE ===")
 
 # Key Capture
 def is_key_pressed(code):
-    v = (code >> 24) & 0xFF if code > 65535 else code & 0xFF
+    import Quartz
+    v = key_code(code)
     return Quartz.CGEventSourceKeyState(Quartz.kCGEventSourceStateCombinedSessionState, min(255, max(0, v)))
 
-CONFIG_PATH = os.path.expanduser("~/.brtn_config.json")
-def load_config():
-    defaults = {"start_trigger": "hold", "start_key_code": 63, "show_icon": True}
-    if os.path.exists(CONFIG_PATH):
+def key_codes(config):
+    codes = {config.get("start_key_code", 63), config.get("end_key_code", 63), config.get("cancel_key_code", 0)}
+    return {key_code(c) for c in codes if c}
+
+def run_keys(config, dispatch, active):
+    # `active` holds the running source so a config reload can retarget its codes
+    codes = key_codes(config)
+    log(f"STARTUP: Hotkeys live {(time.perf_counter() - T_LAUNCH) * 1000:.0f} ms after launch.")
+    if config.get("input_backend", "quartz") == "quartz":
+        try:
+            active[:] = [QuartzKeySource(codes)]
+            active[0].run(dispatch)
+            return
+        except Exception as e:
+            log(f"INPUT: Event tap failed ({e}), polling instead.")
+    active[:] = [PollingKeySource(codes, is_key_pressed)]
+    active[0].run(dispatch)
+
+# UI queue that also pokes a pipe, so Tk's mainloop wakes on put() instead of polling
+class WakeQueue(queue.Queue):
+    def __init__(self):
+        super().__init__()
+        self.fd, self.wfd = os.pipe()
+        os.set_blocking(self.fd, False); os.set_blocking(self.wfd, False)
+
+    def put(self, item, block=True, timeout=None):
+        super().put(item, block, timeout)
+        try: os.write(self.wfd, b"x")
+        except BlockingIOError: pass # pipe already full of wakeups
+
+# Badge animation: one level read per frame, bar wobble precomputed for a full sine cycle
+UI_FRAME_MS = 33
+WOBBLE = [[0.6 + 0.4 * abs(math.sin(step * 2 * math.pi / 32 + i)) for i in range(5)] for step in range(32)]
+
+# Stands in for Engine while brtn_engine is still being imported. A key press
+# that arrives before then waits for it instead of being dropped.
+class LazyEngine:
+    def __init__(self, ui, config):
+        self.engine = None
+        self.ready = threading.Event()
+        threading.Thread(target=self._load, args=(ui, config), daemon=True).start()
+
+    def _load(self, ui, config):
         try:
-            with open(CONFIG_PATH, 'r') as f: return {**defaults, **json.load(f)}
-        except: pass
-    return defaults
+            from brtn_engine import Engine
+            self.engine = Engine(ui, config)
+            log(f"STARTUP: Engine ready {(time.perf_counter() - T_LAUNCH) * 1000:.0f} ms after launch (model loading).")
+        except Exception as e:
+            log(f"FATAL ERROR: Engine failed to start: {e}")
+        finally:
+            self.ready.set() # never leave the key or config thread waiting on a dead engine
+
+    @property
+    def rec(self):
+        return self.engine.rec if self.engine else False
+
+    def start(self):
+        self.ready.wait()
+        if self.engine: self.engine.start()
+
+    def stop(self):
+        if self.engine: self.engine.stop()
+
+    def cancel(self):
+        if self.engine: self.engine.cancel()
+
+    def wake(self):
+        # First tap of a double-tap, say: reload an idle model while the trigger decides
+        if self.engine: self.engine.wake()
+
+    def reconfigure(self, config):
+        self.ready.wait()
+        if self.engine: self.engine.reconfigure(config)
 
 class TranscriberUI:
     def __init__(self):
         self.root = None
         self.canvas = None
         self.waves = []
-        self.queue = queue.Queue()
+        self.queue = WakeQueue()
         self.animating = False
         self.step = 0
-        self.vol = 0
+        self.meter = None # brtn_audio.LevelMeter, attached by Engine
 
     def create(self):
         self.root = tk.Tk()
@@ -88,10 +151,14 @@ class TranscriberUI:
         # MAP ONCE and never withdraw/deiconify again (prevents focus shuffling)
         self.root.deiconify()
         self.root.update()
+        self.root.tk.createfilehandler(self.queue.fd, tk.READABLE, lambda fd, mask: self.update())
         log("UI: Ghost Badge Ready.")
 
     def update(self):
         if not self.root: return
+        try:
+            while os.read(self.queue.fd, 512): pass
+        except BlockingIOError: pass
         try:
             while True:
                 cmd, val = self.queue.get_nowait()
@@ -106,122 +173,40 @@ class TranscriberUI:
                 elif cmd == "color":
                     for w in self.waves: self.canvas.itemconfig(w, fill=val)
         except queue.Empty: pass
-        self.root.update()
 
     def animate(self):
         if not self.animating: return
-        self.step += 1
+        self.step = (self.step + 1) % len(WOBBLE)
+        rms = self.meter.read()[0] if self.meter else 0.0
+        vol = min(1.0, rms * 32768 / 1800)
         for i, w in enumerate(self.waves):
-            h = 4 + self.vol * 40 * (0.6 + 0.4 * abs(math.sin(self.step * 0.2 + i)))
+            h = 4 + vol * 40 * WOBBLE[self.step][i]
             self.canvas.coords(w, 39+i*8, 55-h, 39+i*8, 55+h)
-        self.root.after(20, self.animate)
-
-class Engine:
-    def __init__(self, ui):
-        self.ui = ui
-        self.pa = pyaudio.PyAudio()
-        self.keyboard = Controller()
-        self.model = None
-        self.rec = False
-        self.frames = []
-        threading.Thread(target=self._load, daemon=True).start()
-
-    def _load(self):
-        self.model = WhisperModel("base", device="cpu", compute_type="int8", cpu_threads=4)
-        log("ENGINE: Model Loaded.")
-
-    def start(self):
-        if self.rec: return
-        self.rec = True
-        self.frames = []
-        self.ui.queue.put(("show", None))
-        self.ui.queue.put(("color", "#EA6363"))
-        threading.Thread(target=self._run_rec, daemon=True).start()
-
-    def stop(self):
-        if not self.rec: return
-        self.rec = False
-        self.ui.queue.put(("color", "#1DB954")) # Green
-
-    def _run_rec(self):
-        try:
-            stream = self.pa.open(format=pyaudio.paInt16, channels=1, rate=16000, input=True, frames_per_buffer=1024)
-            while self.rec:
-                data = stream.read(1024, exception_on_overflow=False)
-                self.frames.append(data)
-                v = np.frombuffer(data, dtype=np.int16)
-                self.ui.vol = min(1.0, np.abs(v).mean() / 1500) if v.size > 0 else 0
-            stream.stop_stream(); stream.close()
-            self.process()
-        except: pass
-
-    def process(self):
-        log("TRANS: Start")
-        # 1. HIDE IMMEDIATELY to return focus
-        self.ui.queue.put(("hide", None))
-        
-        try:
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tf:
-                wf = wave.open(tf.name, 'wb')
-                wf.setnchannels(1); wf.setsampwidth(2); wf.setframerate(16000)
-                wf.writeframes(b''.join(self.frames)); wf.close()
-                
-                while not self.model: time.sleep(0.1)
-                segments, info = self.model.transcribe(tf.name, beam_size=1, vad_filter=True, language="en")
-                text = " ".join([s.text for s in segments]).strip()
-                
-                log(f"TRANS: Result: '{text}'")
-                
-                if text and len(text) > 1:
-                    # 2. Use Clipboard - much more reliable than direct typing for large bursts
-                    pyperclip.copy(text)
-                    log(f"CLIPBOARD: Verified '{pyperclip.paste()[:20]}...'")
-                    
-                    time.sleep(0.4) # Focus settle
-                    
-                    # 3. MODIFIER FLUSH (Ensure Fn-key/Cmd aren't "hanging")
-                    for k in [Key.cmd, Key.shift, Key.alt, Key.ctrl, Key.cmd_r]:
-                        self.keyboard.release(k)
-                    
-                    # 4. ROBUST NATIVE PASTE
-                    log("ACTION: Executing Native Paste Shortcut...")
-                    os.system('osascript -e "tell application \\"System Events\\" to keystroke \\"v\\" using command down"')
-                else:
-                    log("TRANS: No text found.")
-            os.remove(tf.name)
-        except Exception as e:
-            log(f"PROC ERROR: {e}")
+        self.root.after(UI_FRAME_MS, self.animate)
 
 def main():
     config = load_config()
+    if config.get("metrics_port"): METRICS.serve(config["metrics_port"])
+    if config.get("trace_path"): atexit.register(METRICS.dump_trace, os.path.expanduser(config["trace_path"]))
     ui = TranscriberUI()
+    engine = LazyEngine(ui, config)
+    
+    # Key events arrive on their own thread; Tk sleeps until the engine queues a UI command
+    machine = TriggerMachine.from_config(config, engine.start, engine.stop, lambda: engine.rec, engine.cancel, engine.wake)
+    keys = []
+    threading.Thread(target=run_keys, args=(config, machine.feed, keys), daemon=True).start()
+
+    # Settings changes apply without a restart: keys at once, models in the background
+    def on_config(new):
+        log("CONFIG: Reloaded.")
+        machine.reconfigure(new)
+        for source in keys: source.codes = key_codes(new)
+        engine.reconfigure(new)
+    ConfigWatcher(on_config).start()
     ui.create()
-    engine = Engine(ui)
     
     check_accessibility()
-    
-    sk = config.get("start_key_code", 63)
-    st = config.get("start_trigger", "hold")
-    last_p = False
-    last_t = 0
-    
-    while True:
-        p = is_key_pressed(sk)
-        now = time.time()
-        
-        if st == "hold":
-            if p and not last_p: engine.start()
-            elif not p and last_p: engine.stop()
-        elif st == "tap":
-            if p and not last_p: engine.start() if not engine.rec else engine.stop()
-        elif st == "double_tap":
-            if p and not last_p:
-                if now - last_t < 0.4: engine.start() if not engine.rec else engine.stop()
-                last_t = now
-        
-        last_p = p
-        ui.update()
-        time.sleep(0.01)
+    ui.root.mainloop()
 
 if __name__ == "__main__":
     try: main()
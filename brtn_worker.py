@@ -0,0 +1,356 @@
+import os
+import sys
+import json
+import time
+import queue
+import bisect
+import dataclasses
+import socket
+import argparse
+import threading
+import subprocess
+import socketserver
+from types import SimpleNamespace
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+from brtn_audio import RATE
+from brtn_config import auto_threads
+from brtn_metrics import METRICS, log as _log
+
+# Long-lived model process: loads WhisperModel once, warms it up and serves
+# decodes to any number of front ends over a Unix socket (or stdio).
+#
+# Protocol, one request per line:
+#   {"cmd": "ping"}\n
+#   {"cmd": "transcribe", "samples": N, "options": {...}}\n + N float32 LE samples
+# Every reply is a single JSON line with "ok" set.
+SOCKET_PATH = os.path.expanduser("~/.brtn_worker.sock")
+
+def log(msg):
+    _log(f"WORKER: {msg}")
+
+def load_model(size="base", compute_type="int8", cpu_threads=4, num_workers=1):
+    from faster_whisper import WhisperModel
+    return WhisperModel(size, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads, num_workers=num_workers)
+
+def resident_mb():
+    # Current RSS of this process (getrusage only knows the peak)
+    try:
+        with open("/proc/self/statm") as f: return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        out = subprocess.run(["ps", "-o", "rss=", "-p", str(os.getpid())], capture_output=True, text=True)
+        return int(out.stdout.strip() or 0) / 1024
+
+def memory_pressure():
+    # macOS: the kernel's own verdict (1 normal, 2 warn, 4 critical); Linux: under 10% available
+    if sys.platform == "darwin":
+        out = subprocess.run(["sysctl", "-n", "kern.memorystatus_vm_pressure_level"], capture_output=True, text=True)
+        return int(out.stdout.strip() or 1) >= 2
+    try:
+        with open("/proc/meminfo") as f: info = {l.split(":")[0]: int(l.split()[1]) for l in f}
+        return info["MemAvailable"] < info["MemTotal"] * 0.1
+    except (OSError, KeyError, ValueError):
+        return False
+
+def warm_up(model):
+    # One throwaway decode pages the weights in and primes CTranslate2's allocators
+    segments, _ = model.transcribe(np.zeros(RATE, dtype=np.float32), beam_size=1, language="en")
+    list(segments)
+
+# Several model sizes, loaded on first use and evicted least-recently-used
+# beyond `capacity`. Pinned sizes (the fast tier) are never evicted.
+class ModelPool:
+    def __init__(self, capacity=2, compute_type="int8", cpu_threads=4, loader=None, num_workers=1):
+        self.capacity = max(1, capacity)
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self.num_workers = num_workers
+        self.loader = loader or load_model
+        self.models = OrderedDict()
+        self.pinned = set()
+        self.lock = threading.Lock()
+        self.loading = {}
+        self.sizes = {} # size -> MB the process grew by when it was loaded
+
+    def put(self, size, model, pin=False):
+        with self.lock:
+            self.models[size] = model
+            self.models.move_to_end(size)
+            if pin: self.pinned.add(size)
+            self._evict()
+
+    def get(self, size, pin=False):
+        with self.lock:
+            if size in self.models:
+                self.models.move_to_end(size)
+                if pin: self.pinned.add(size)
+                return self.models[size]
+            load_lock = self.loading.setdefault(size, threading.Lock())
+        with load_lock: # one load per size, concurrent callers wait for it
+            with self.lock:
+                if size in self.models: return self.models[size]
+            t, rss = time.time(), resident_mb()
+            model = self.loader(size, self.compute_type, self.cpu_threads, self.num_workers)
+            self.sizes[size] = max(0.0, resident_mb() - rss)
+            log(f"Loaded '{size}' in {time.time() - t:.2f}s (+{self.sizes[size]:.0f} MB resident).")
+            self.put(size, model, pin)
+            METRICS.set("model_resident_mb", self.footprint())
+            return model
+
+    def _evict(self):
+        for size in list(self.models):
+            if len(self.models) <= self.capacity: break
+            if size in self.pinned: continue
+            del self.models[size]
+            log(f"Evicted '{size}'.")
+
+    def resident(self):
+        with self.lock: return list(self.models)
+
+    def footprint(self):
+        # MB attributable to the loaded models, measured as RSS growth at load time
+        return sum(self.sizes.get(size, 0.0) for size in self.resident())
+
+    def clear(self):
+        # Drops every model, pinned ones included; callers still holding one keep it alive
+        with self.lock:
+            self.models.clear()
+            self.pinned.clear()
+        METRICS.set("model_resident_mb", 0)
+
+# BATCHED INFERENCE
+# Several short clips (<= 30 s, one Whisper window each) from different takes
+# or files run as one batched encoder/decoder pass through faster-whisper's
+# BatchedInferencePipeline. The clips are laid end to end and passed as
+# clip_timestamps, and each output segment goes back to its clip by start time.
+# Clips arrive already silence-trimmed, so the pipeline's own VAD is skipped.
+BATCH_CLIP_SECONDS = 30
+
+def transcribe_batch(model, audios, **options):
+    # -> [(segments, info)] in the order of `audios`
+    if len(audios) == 1 or type(model).__name__ != "WhisperModel":
+        # Remote and fake models have no batched path; run them one by one
+        return [(list(segs), info) for segs, info in (model.transcribe(a, **options) for a in audios)]
+    from faster_whisper import BatchedInferencePipeline
+    starts, pos = [], 0
+    for a in audios:
+        starts.append(pos)
+        pos += a.size
+    options = {k: v for k, v in options.items() if k not in ("vad_filter", "vad_parameters")}
+    clips = [{"start": s, "end": s + a.size} for s, a in zip(starts, audios)]
+    with METRICS.span("batch_decode", size=len(audios), seconds=pos / RATE):
+        segments, info = BatchedInferencePipeline(model).transcribe(
+            np.concatenate(audios), clip_timestamps=clips, vad_filter=False, batch_size=len(audios), **options)
+        out = [[] for _ in audios]
+        for seg in segments:
+            # Timestamps are rounded to 10 ms, so nudge forward before looking up the clip,
+            # then shift the segment back onto that clip's own timeline
+            i = bisect.bisect_right(starts, int((seg.start + 0.005) * RATE)) - 1
+            offset = starts[i] / RATE
+            out[i].append(dataclasses.replace(seg, start=seg.start - offset, end=seg.end - offset))
+    METRICS.inc("batches_total")
+    METRICS.inc("batched_clips_total", len(audios))
+    return [(segs, info) for segs in out]
+
+# Gathers transcribe() calls from concurrent threads (decode workers) into
+# batches of up to max_batch, waiting at most max_wait for company. `demand`
+# says how many callers could still join, so a lone caller never waits.
+class BatchScheduler:
+    def __init__(self, max_batch=8, max_wait=0.05, demand=None):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.demand = demand or (lambda: max_batch)
+        self.q = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def transcribe(self, model, audio, **options):
+        # Same shape as WhisperModel.transcribe; blocks until this clip's batch has run
+        if audio.size > BATCH_CLIP_SECONDS * RATE: return model.transcribe(audio, **options)
+        fut = Future()
+        self.q.put((model, audio, options, fut))
+        return fut.result()
+
+    def _run(self):
+        while True:
+            batch = [self.q.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < min(self.max_batch, self.demand()):
+                try: batch.append(self.q.get(timeout=max(0.0, deadline - time.perf_counter())))
+                except queue.Empty: break
+            # Only clips for the same model with identical options can share a pass
+            groups = {}
+            for req in batch:
+                groups.setdefault((id(req[0]), json.dumps(req[2], sort_keys=True, default=str)), []).append(req)
+            for reqs in groups.values():
+                try:
+                    results = transcribe_batch(reqs[0][0], [r[1] for r in reqs], **reqs[0][2])
+                    for r, res in zip(reqs, results): r[3].set_result(res)
+                except Exception as e:
+                    for r in reqs:
+                        if not r[3].done(): r[3].set_exception(e)
+
+def write_request(f, req, audio=None):
+    if audio is not None:
+        audio = np.ascontiguousarray(audio, dtype="<f4")
+        req = {**req, "samples": int(audio.size)}
+    f.write(json.dumps(req).encode() + b"\n")
+    if audio is not None: f.write(audio.tobytes())
+    f.flush()
+
+def read_request(f):
+    line = f.readline()
+    if not line: return None, None
+    req = json.loads(line)
+    n = int(req.get("samples", 0))
+    audio = None
+    if n:
+        data = f.read(n * 4)
+        if len(data) != n * 4: raise EOFError("short audio payload")
+        audio = np.frombuffer(data, dtype="<f4")
+    return req, audio
+
+class Worker:
+    def __init__(self, size="base", compute_type="int8", cpu_threads=4, capacity=2, num_workers=1):
+        self.size = size
+        t = time.time()
+        self.pool = ModelPool(capacity, compute_type, cpu_threads, num_workers=num_workers)
+        warm_up(self.pool.get(size, pin=True))
+        log(f"Model '{size}' ready in {time.time() - t:.2f}s.")
+        self.lock = threading.Lock()
+
+    def handle(self, req, audio):
+        cmd = req.get("cmd")
+        if cmd == "ping":
+            return {"ok": True, "model": self.size, "resident": self.pool.resident(), "pid": os.getpid()}
+        if cmd == "transcribe":
+            if audio is None: audio = np.zeros(0, dtype=np.float32)
+            model = self.pool.get(req.get("model") or self.size)
+            t = time.time()
+            with self.lock, METRICS.span("worker_decode", model=req.get("model") or self.size):
+                segments, info = model.transcribe(audio, **req.get("options", {}))
+                segs = [{"start": s.start, "end": s.end, "text": s.text, "avg_logprob": s.avg_logprob} for s in segments]
+            METRICS.inc("worker_requests_total")
+            return {"ok": True, "text": " ".join(s["text"] for s in segs).strip(), "segments": segs,
+                    "language": info.language, "duration": audio.size / RATE, "elapsed": time.time() - t}
+        return {"ok": False, "error": f"unknown cmd '{cmd}'"}
+
+    def serve(self, rfile, wfile):
+        while True:
+            try:
+                req, audio = read_request(rfile)
+                if req is None: return
+                resp = self.handle(req, audio)
+            except EOFError: return
+            except Exception as e:
+                log(f"ERROR: {e}")
+                resp = {"ok": False, "error": str(e)}
+            wfile.write(json.dumps(resp).encode() + b"\n"); wfile.flush()
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.worker.serve(self.rfile, self.wfile)
+
+class WorkerClient:
+    def __init__(self, path=SOCKET_PATH, timeout=None):
+        self.path = path
+        self.timeout = timeout
+
+    def _call(self, req, audio=None):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(self.timeout)
+            s.connect(self.path)
+            with s.makefile("rwb") as f:
+                write_request(f, req, audio)
+                line = f.readline()
+        if not line: raise ConnectionError("worker closed the connection")
+        resp = json.loads(line)
+        if not resp.get("ok"): raise RuntimeError(resp.get("error"))
+        return resp
+
+    def ping(self):
+        return self._call({"cmd": "ping"})
+
+    def transcribe(self, audio, model=None, **options):
+        return self._call({"cmd": "transcribe", "model": model, "options": options}, audio)
+
+# Drop-in for WhisperModel inside Engine: same transcribe() shape, decoded remotely
+class RemoteModel:
+    def __init__(self, client, size=None):
+        self.client = client
+        self.size = size
+
+    def transcribe(self, audio, **options):
+        r = self.client.transcribe(audio, self.size, **options)
+        segments = [SimpleNamespace(**s) for s in r["segments"]]
+        return segments, SimpleNamespace(language=r["language"], duration=r["duration"])
+
+# ModelPool look-alike whose models live in the worker process
+class RemotePool:
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, size, pin=False):
+        return RemoteModel(self.client, size)
+
+    def put(self, size, model, pin=False): pass
+
+    def resident(self):
+        return self.client.ping().get("resident", [])
+
+def ensure_worker(path=SOCKET_PATH, wait=60, args=()):
+    client = WorkerClient(path)
+    try:
+        client.ping()
+        return client
+    except OSError: pass
+    log("No worker on socket, spawning one.")
+    subprocess.Popen([sys.executable, os.path.abspath(__file__), "--socket", path, *args],
+                     start_new_session=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + wait
+    while time.time() < deadline:
+        try:
+            client.ping()
+            return client
+        except OSError: time.sleep(0.2)
+    raise TimeoutError(f"worker did not come up on {path}")
+
+def main():
+    ap = argparse.ArgumentParser(description="BRTN persistent transcription worker")
+    ap.add_argument("--socket", default=SOCKET_PATH)
+    ap.add_argument("--stdio", action="store_true", help="serve on stdin/stdout instead of a socket")
+    ap.add_argument("--model", default="base")
+    ap.add_argument("--compute-type", default="int8")
+    ap.add_argument("--threads", type=int, default=0, help="cpu_threads (default: auto)")
+    ap.add_argument("--workers", type=int, default=1, help="CTranslate2 num_workers")
+    ap.add_argument("--resident", type=int, default=2, help="model sizes kept loaded at once")
+    ap.add_argument("--metrics-port", type=int, default=0, help="serve /metrics and /trace.json on localhost")
+    args = ap.parse_args()
+    if args.metrics_port: METRICS.serve(args.metrics_port)
+
+    if not args.stdio:
+        try:
+            WorkerClient(args.socket, timeout=2).ping()
+            log(f"Worker already running on {args.socket}")
+            return
+        except OSError: pass
+
+    worker = Worker(args.model, args.compute_type, args.threads or auto_threads(), args.resident, args.workers)
+    if args.stdio:
+        worker.serve(sys.stdin.buffer, sys.stdout.buffer)
+        return
+
+    if os.path.exists(args.socket): os.remove(args.socket)
+    server = socketserver.ThreadingUnixStreamServer(args.socket, _Handler)
+    server.daemon_threads = True
+    server.worker = worker
+    os.chmod(args.socket, 0o600)
+    log(f"Listening on {args.socket}")
+    try: server.serve_forever()
+    finally:
+        server.server_close()
+        try: os.remove(args.socket)
+        except OSError: pass
+
+if __name__ == "__main__":
+    main()